@@ -1,6 +1,5 @@
-import re
-import phonenumbers
 import pandas as pd
+from pii_columns import detect_pii
 
 # Function to detect emails, phone numbers, and names in the specified columns from a CSV file
 def pii_detection_from_csv(csv_file, phone_column, name_column, email_column):
@@ -10,32 +9,24 @@ def pii_detection_from_csv(csv_file, phone_column, name_column, email_column):
     except ValueError as e:
         return f"Error: {e}", None
     
-    # Regular expression for detecting email addresses
-    email_pattern = r'[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+'
-    
+    # Detection runs over whole columns with precompiled patterns, see pii_columns.py
     detected_columns = {}  # To store columns with detected PII and their first 5 values
     
     # Detect emails in the specified column
     if email_column:
-        df['email_detected'] = df[email_column].apply(lambda x: bool(re.search(email_pattern, str(x))))
+        df['email_detected'] = detect_pii(df[email_column], 'email')
         if df['email_detected'].any():
             detected_columns[email_column] = df[df['email_detected']][email_column].head(5).tolist()
     
     # Detect phone numbers in the specified column
     if phone_column:
-        def is_phone_number(value):
-            try:
-                parsed = phonenumbers.parse(str(value), None)
-                return phonenumbers.is_valid_number(parsed)
-            except:
-                return False
-        df['phone_detected'] = df[phone_column].apply(is_phone_number)
+        df['phone_detected'] = detect_pii(df[phone_column], 'phone')
         if df['phone_detected'].any():
             detected_columns[phone_column] = df[df['phone_detected']][phone_column].head(5).tolist()
     
     # Detect names in the specified column (heuristic: starts with capital letters)
     if name_column:
-        df['name_detected'] = df[name_column].apply(lambda x: bool(re.match(r'^[A-Z][a-z]+', str(x))))
+        df['name_detected'] = detect_pii(df[name_column], 'capitalized name')
         if df['name_detected'].any():
             detected_columns[name_column] = df[df['name_detected']][name_column].head(5).tolist()
     
@@ -1,6 +1,5 @@
-import re
-import phonenumbers
 import pandas as pd
+from pii_columns import detect_pii
 
 # Function to detect PII in a specified column from a CSV file
 def pii_detection_from_csv(csv_file, column_name, attribute):
@@ -22,79 +21,11 @@ def pii_detection_from_csv(csv_file, column_name, attribute):
     detected_columns = {}  # To store columns with detected PII and their first 10 values
 
 
-    if attribute == 'email':
-        email_pattern = r'[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+'
-        df['email_detected'] = df[column_name].apply(lambda x: bool(re.search(email_pattern, str(x))))
-        if df['email_detected'].any():
-            detected_columns[column_name] = df[df['email_detected']][column_name].head(10).tolist()
-    
-    elif attribute == 'phone':
-        def is_phone_number(value):
-            try:
-                parsed = phonenumbers.parse(str(value), None)
-                return phonenumbers.is_valid_number(parsed)
-            except:
-                return False
-        df['phone_detected'] = df[column_name].apply(is_phone_number)
-        if df['phone_detected'].any():
-            detected_columns[column_name] = df[df['phone_detected']][column_name].head(10).tolist()
-
-    elif attribute in ['first name', 'last name', 'full name']:
-        # Match only pure alphabetic names (first and last names with no special characters or numbers)
-        name_pattern = r'^[A-Za-z]+(?: [A-Za-z]+)*$'
-        
-        df['name_detected'] = df[column_name].apply(lambda x: bool(re.match(name_pattern, str(x))))
-        
-        # Only detect PII if the name contains valid alphabets and no special characters or numbers
-        if df['name_detected'].any():
-            detected_columns[column_name] = df[df['name_detected']][column_name].head(10).tolist()
-
-    elif attribute == 'birthdate':
-        def is_pii_birthdate(date_str):
-            try:
-                # Attempt to parse various common date formats
-                date_formats = ['%m-%d-%Y', '%d-%m-%Y', '%Y-%d-%m', '%m/%d/%Y', '%d/%m/%Y', '%Y/%d/%m']
-                for date_format in date_formats:
-                    try:
-                        date_obj = datetime.strptime(date_str, date_format)
-                        break
-                    except ValueError:
-                        continue
-                else:
-                    return False  # If no formats matched, it's not a valid date
-
-                # If the year is before 1900, consider it non-PII
-                if date_obj.year < 1900:
-                    return False
-                return True
-            except:
-                return False
-
-        df['birthdate_detected'] = df[column_name].apply(lambda x: is_pii_birthdate(str(x)))
-        if df['birthdate_detected'].any():
-            detected_columns[column_name] = df[df['birthdate_detected']][column_name].head(10).tolist()
-    
-    elif attribute == 'ssn':
-        # Match SSN in the format XXX-XX-XXXX
-        ssn_pattern = r'^\d{3}-\d{3}-\d{3}$'
-        # Check for valid SSNs, excluding 000-00-0000
-        df['ssn_detected'] = df[column_name].apply(
-            lambda x: bool(re.match(ssn_pattern, str(x))) and str(x) != "000-000-000"
-        )
-        if df['ssn_detected'].any():
-            detected_columns[column_name] = df[df['ssn_detected']][column_name].head(10).tolist()
-    elif attribute == 'address':
-        # Match addresses that consist of alphabetic characters and spaces
-        address_pattern = r'^[A-Za-z\s]+$'
-        df['address_detected'] = df[column_name].apply(lambda x: bool(re.match(address_pattern, str(x))))
-        if df['address_detected'].any():
-            detected_columns[column_name] = df[df['address_detected']][column_name].head(10).tolist()
-    elif attribute == 'credit card':
-        # Match credit card numbers in the format XXXX-XXXX-XXXX-XXXX
-        credit_card_pattern = r'^\d{4}-\d{4}-\d{4}-\d{4}$'
-        df['credit_card_detected'] = df[column_name].apply(lambda x: bool(re.match(credit_card_pattern, str(x))))
-        if df['credit_card_detected'].any():
-            detected_columns[column_name] = df[df['credit_card_detected']][column_name].head(10).tolist()
+    if attribute in ['email', 'phone', 'first name', 'last name', 'full name', 'birthdate', 'ssn', 'address', 'credit card']:
+        # Whole-column detection with precompiled patterns, see pii_columns.py
+        df['pii_detected'] = detect_pii(df[column_name], attribute)
+        if df['pii_detected'].any():
+            detected_columns[column_name] = df[df['pii_detected']][column_name].head(10).tolist()
     
     # If any PII is detected in the column, return False and the detected data
     if detected_columns:
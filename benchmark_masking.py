@@ -0,0 +1,250 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
+import pandas as pd
+import mask
+import mask_without_column_header
+from masking_plan import compile_plan
+from masking_functions import (
+    mask_acct,
+    mask_any_name,
+    mask_default,
+    mask_first_name,
+    mask_integer,
+    mask_last_name,
+    mask_only_allowed_values,
+    mask_org_name,
+)
+
+# Synthetic fixtures use the 15-column layout of cal.csv/output.csv and are masked
+# with the ACCT...DT2 config of masking_functions, whichever config is active there
+fixture_mask_functions = {
+    "GENDER": mask_only_allowed_values,
+    "FIRST_NAME": mask_first_name,
+    "LAST_NAME": mask_last_name,
+    "ANY_NAME": mask_any_name,
+    "ORG_NAME": mask_org_name,
+    "ACCT": mask_acct,
+    "SIN": mask_integer,
+}
+
+fixture_columns_to_mask = {
+    "ACCT": ("VARCHAR", 10, None),
+    "GENDER": ("VARCHAR", 2, {"allowed_values": ["F", "M"]}),
+    "ID1": ("INTEGER", 4, None),
+    "ID2": ("INTEGER", None, None),
+    "DECIMAL_COLUMN": ("DECIMAL", (5, 4), None),
+    "DATE_COLUMN": ("DATE", None, None),
+    "FIRST_NAME": ("VARCHAR", 8, None),
+    "LAST_NAME": ("VARCHAR", 8, None),
+    "ANY_NAME": ("VARCHAR", 16, {"separator": " "}),
+    "ORG_NAME": ("VARCHAR", 206, {"separator": " "}),
+    "FULL_NAME": ("VARCHAR", 45, None),
+    "CAL": ("VARCHAR", 45, None),
+    "SIN": ("VARCHAR", 4, None),
+    "NARROW": ("VARCHAR", 4, None),
+    "DT2": ("TIMESTAMP", None, None),
+}
+
+fixture_columns = list(fixture_columns_to_mask)
+
+# mask_without_column_header looks columns up by position
+no_header_mask_functions = {
+    fixture_columns.index(column): mask_function for column, mask_function in fixture_mask_functions.items()
+}
+no_header_columns_to_mask = {
+    fixture_columns.index(column): spec for column, spec in fixture_columns_to_mask.items() if column != "FULL_NAME"
+}
+
+SIZES = {"10K": 10000, "1M": 1000000, "10M": 10000000}
+
+# At least two workers, so the parallel cases take the sharded path on any machine
+WORKERS = max(2, os.cpu_count() or 1)
+
+# mask_csv / mask_csv_no_header keyword arguments for each benchmark case
+CASES = {
+    "cell": {"vectorized": False},
+    "whole": {"vectorized": True},
+    "chunked": {"vectorized": True, "chunksize": 100000},
+    "passthrough": {"passthrough": True, "chunksize": 100000},
+    "parallel": {"vectorized": True, "chunksize": 100000, "workers": WORKERS},
+    "no_header": {"vectorized": True, "workers": WORKERS},
+}
+
+# Whole-file cases hold the file in memory and are only run up to 1M rows by default
+DEFAULT_CASES = ["cell", "whole", "chunked", "passthrough", "parallel", "no_header"]
+IN_MEMORY_CASES = ["cell", "whole"]
+
+
+def write_fixture(path, rows, header=True, block_size=100000, seed=0):
+    # Values are drawn with the vectorized maskers themselves, so the fixture has the
+    # same shapes (string lengths, name pools, date formats) as real masked output
+    rng = np.random.default_rng(seed)
+    generators = compile_plan(fixture_columns_to_mask, {**fixture_mask_functions, "ACCT": mask_default})
+    with open(path, "w") as out:
+        for block_start in range(0, rows, block_size):
+            n = min(block_size, rows - block_start)
+            empty = np.empty(n, dtype=object)
+            block = pd.DataFrame({generator.column: generator.mask(empty, rng) for generator in generators})
+            block["FULL_NAME"] = block["FIRST_NAME"] + " " + block["LAST_NAME"]
+            block.to_csv(out, index=False, sep="|", header=header and block_start == 0)
+
+
+def fixture_path(fixture_dir, rows, header):
+    path = os.path.join(fixture_dir, f"fixture_{rows}{'' if header else '_no_header'}.csv")
+    if not os.path.exists(path):
+        print(f"Writing {path}")
+        write_fixture(path, rows, header=header)
+    return path
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux; worker processes are counted separately
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    )
+    return peak / 1024
+
+
+def run_case(case, input_file, output_file, rows):
+    # Runs in its own process so peak RSS belongs to this case alone
+    mask.mask_functions = fixture_mask_functions
+    mask_without_column_header.mask_functions = no_header_mask_functions
+    options = dict(CASES[case])
+    start = time.perf_counter()
+    if case == "no_header":
+        data_masker = mask_without_column_header.DataMasker(seed=0)
+        data_masker.mask_csv_no_header(
+            input_file, output_file, no_header_columns_to_mask, -1, header_present="Y", **options
+        )
+    else:
+        data_masker = mask.DataMasker(seed=0)
+        data_masker.mask_csv(input_file, output_file, fixture_columns_to_mask, -1, **options)
+    seconds = time.perf_counter() - start
+    return {"rows": rows, "seconds": seconds, "rows_per_sec": rows / seconds, "peak_rss_mb": peak_rss_mb()}
+
+
+def benchmark_case(case, size, fixture_dir):
+    input_file = fixture_path(fixture_dir, SIZES[size], header=case != "no_header")
+    output_file = os.path.join(fixture_dir, f"masked_{case}_{size}.csv")
+    command = [sys.executable, os.path.abspath(__file__), "--run-case", case, input_file, output_file, str(SIZES[size])]
+    completed = subprocess.run(command, capture_output=True, text=True, check=True)
+    os.remove(output_file)
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+def benchmark_columns(fixture_dir, rows, cell_rows, repeat=3):
+    # Cost per masked value of each column on its own, vectorized and per cell;
+    # the best of repeat runs is kept so one slow run is not reported as a regression
+    mask.mask_functions = fixture_mask_functions
+    sample = pd.read_csv(fixture_path(fixture_dir, rows, header=True), sep="|", dtype=str)
+    data_masker = mask.DataMasker(seed=0)
+    results = {}
+    for column, spec in fixture_columns_to_mask.items():
+        if column == "FULL_NAME":
+            continue
+        result = {"data_type": spec[0]}
+        for label, vectorized, n in [("vectorized", True, rows), ("cell", False, cell_rows)]:
+            # A warm-up batch builds the plan and any lookup tables outside the timing
+            data_masker.mask_dataframe(sample[[column]].head(100).copy(), {column: spec}, vectorized)
+            timings = []
+            for _ in range(repeat):
+                frame = sample[[column]].head(n).copy()
+                start = time.perf_counter()
+                data_masker.mask_dataframe(frame, {column: spec}, vectorized=vectorized)
+                timings.append(time.perf_counter() - start)
+            result[f"{label}_us_per_value"] = min(timings) / len(frame) * 1e6
+        results[column] = result
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # A case regresses when its throughput drops, or its peak RSS grows, by more than tolerance
+    regressions = []
+    for key, result in results["cases"].items():
+        previous = baseline.get("cases", {}).get(key)
+        if previous is None:
+            continue
+        if result["rows_per_sec"] < previous["rows_per_sec"] * (1 - tolerance):
+            regressions.append(f"{key}: {result['rows_per_sec']:.0f} rows/sec, baseline {previous['rows_per_sec']:.0f}")
+        if result["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{key}: {result['peak_rss_mb']:.0f} MB peak RSS, baseline {previous['peak_rss_mb']:.0f}")
+    for column, result in results["columns"].items():
+        previous = baseline.get("columns", {}).get(column)
+        if previous is None:
+            continue
+        for label in ["vectorized", "cell"]:
+            cost, previous_cost = result[f"{label}_us_per_value"], previous[f"{label}_us_per_value"]
+            if cost > previous_cost * (1 + tolerance):
+                regressions.append(f"{column} ({label}): {cost:.2f} us/value, baseline {previous_cost:.2f}")
+    return regressions
+
+
+def print_report(results):
+    print(f"{'case':<20}{'rows':>12}{'seconds':>10}{'rows/sec':>12}{'peak RSS MB':>13}")
+    for key, result in results["cases"].items():
+        print(
+            f"{key:<20}{result['rows']:>12}{result['seconds']:>10.2f}"
+            f"{result['rows_per_sec']:>12.0f}{result['peak_rss_mb']:>13.0f}"
+        )
+    print()
+    print(f"{'column':<16}{'type':<11}{'vectorized us/value':>21}{'cell us/value':>15}")
+    for column, result in results["columns"].items():
+        print(
+            f"{column:<16}{result['data_type']:<11}"
+            f"{result['vectorized_us_per_value']:>21.3f}{result['cell_us_per_value']:>15.3f}"
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--run-case":
+        case, input_file, output_file, rows = sys.argv[2:6]
+        print(json.dumps(run_case(case, input_file, output_file, int(rows))))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Benchmark DataMasker on synthetic 15-column pipe-delimited files")
+    parser.add_argument("--sizes", default="10K,1M,10M", help=f"comma-separated fixture sizes out of {list(SIZES)}")
+    parser.add_argument("--cases", default=",".join(DEFAULT_CASES), help=f"comma-separated cases out of {list(CASES)}")
+    parser.add_argument(
+        "--in-memory-limit", type=int, default=1000000, help="largest fixture the whole-file cases are run on"
+    )
+    parser.add_argument("--fixture-dir", default="benchmark_fixtures", help="fixtures are written once and reused")
+    parser.add_argument("--column-rows", type=int, default=100000, help="rows per column for the vectorized cost")
+    parser.add_argument("--cell-rows", type=int, default=10000, help="rows per column for the per-cell cost")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per column cost, the best is kept")
+    parser.add_argument("--baseline", default="benchmark_baseline.json", help="results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed slowdown before a regression is reported")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    os.makedirs(args.fixture_dir, exist_ok=True)
+    results = {"cases": {}, "columns": {}}
+    for size in args.sizes.split(","):
+        for case in args.cases.split(","):
+            if case in IN_MEMORY_CASES and SIZES[size] > args.in_memory_limit:
+                continue
+            print(f"Running {case} on {size} rows")
+            results["cases"][f"{case}/{size}"] = benchmark_case(case, size, args.fixture_dir)
+    results["columns"] = benchmark_columns(args.fixture_dir, args.column_rows, args.cell_rows, args.repeat)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
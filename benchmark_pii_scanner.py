@@ -0,0 +1,166 @@
+import argparse
+import io
+import json
+import os
+import re
+import sys
+import time
+import numpy as np
+from pii_scanner import CATEGORY_LABELS, PiiScanner, count_categories
+
+# The five regexes of scannnnn2.py as they are, for the five-pass reference
+MULTI_PASS_PATTERNS = {
+    "us_phone": re.compile(r'(\+\d{1,2}\s?)?1?\-?\.?\s?\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}(?:\s?ext\.?\s?\d{1,5})?'),
+    "in_phone": re.compile(r'\+91\s?\d{10}|\+91\s?\(?\d{3}\)?\s?\d{3}\s?\d{4}'),
+    "email": re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'),
+    "ssn": re.compile(r'\b\d{3}-\d{2}-\d{4}\b'),
+    "passport": re.compile(r'\b[A-Z]{1}[0-9]{7}\b'),
+}
+
+WORDS = (
+    "the user request session started finished failed retry cache miss hit payload sent received from to server "
+    "client timeout connection closed opened job batch record updated deleted inserted queue worker status ok"
+).split()
+LEVELS = ["INFO", "DEBUG", "WARN", "ERROR"]
+PII_SAMPLES = [
+    "call 415-555-0134 back",
+    "phone (212) 555 1234 ext. 12",
+    "mobile +1 650.555.0199",
+    "contact +91 9876543210",
+    "reach +91 (022) 555 1234",
+    "mail john.doe@example.com",
+    "cc ops_team+alerts@corp.example.org",
+    "ssn 123-45-6789 on file",
+    "passport K1234567 verified",
+]
+
+
+def write_fixture(path, size_mb, pii_rate=0.05, seed=0):
+    # Log lines with a timestamp, a level, an id and random words; pii_rate of them
+    # carry one of PII_SAMPLES. Lines are drawn from a pool so GBs are written quickly
+    rng = np.random.default_rng(seed)
+    pool = []
+    for i in range(20000):
+        words = " ".join(rng.choice(WORDS, size=rng.integers(6, 16)))
+        line = (
+            f"2024-{rng.integers(1, 13):02d}-{rng.integers(1, 29):02d}T{rng.integers(0, 24):02d}:"
+            f"{rng.integers(0, 60):02d}:{rng.integers(0, 60):02d} {LEVELS[i % 4]} id={rng.integers(0, 10**6)} {words}"
+        )
+        if rng.random() < pii_rate:
+            line += " " + PII_SAMPLES[rng.integers(0, len(PII_SAMPLES))]
+        pool.append(line + "\n")
+    pool = np.array(pool, dtype=object)
+    target = size_mb * 1000000
+    written = 0
+    with open(path, "w") as f:
+        while written < target:
+            block = "".join(pool[rng.integers(0, len(pool), size=10000)])
+            f.write(block)
+            written += len(block)
+
+
+def fixture_path(fixture_dir, size_mb):
+    path = os.path.join(fixture_dir, f"log_{size_mb}mb.txt")
+    if not os.path.exists(path):
+        print(f"Writing {path}")
+        write_fixture(path, size_mb)
+    return path
+
+
+def long_line_data(size, seed=0):
+    # size bytes of PII_SAMPLES and emails whose local part holds a passport number,
+    # with a line break after about one sample in a thousand, so most lines are longer
+    # than a block and block cuts land inside matches
+    rng = np.random.default_rng(seed)
+    samples = PII_SAMPLES + ["K1234567@example.com", "ref.P7654321.x@corp.example.org", "id K1234567."]
+    parts = []
+    written = 0
+    while written < size:
+        part = samples[rng.integers(0, len(samples))] + ("\n" if rng.random() < 0.001 else " ")
+        parts.append(part)
+        written += len(part)
+    return "".join(parts).encode()
+
+
+def check_streaming(data, block_sizes, overlap=4096):
+    # Block sizes whose streamed findings differ from those of a scan of the whole buffer
+    scanner = PiiScanner()
+    expected = scanner.scan(data)
+    return [
+        block_size for block_size in block_sizes
+        if list(scanner.scan_stream(io.BytesIO(data), block_size, overlap)) != expected
+    ]
+
+
+def scan_multi_pass(file_path):
+    # scannnnn2.py without the progress bars and printing: the file is read and split
+    # into lines, then every pattern runs over every line in its own pass
+    with open(file_path, "r", errors="replace") as f:
+        lines = f.read().splitlines()
+    counts = {}
+    for category, regex in MULTI_PASS_PATTERNS.items():
+        matches = []
+        for line in lines:
+            matches.extend(regex.findall(line))
+        counts[category] = len(matches)
+    return counts
+
+
+def scan_single_pass(file_path):
+    return count_categories(PiiScanner().scan_file(file_path))
+
+
+def benchmark(file_path, repeat):
+    size_mb = os.path.getsize(file_path) / 1e6
+    results = {}
+    for name, scan in [("five-pass", scan_multi_pass), ("single-pass", scan_single_pass)]:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            counts = scan(file_path)
+            timings.append(time.perf_counter() - start)
+        seconds = min(timings)
+        results[name] = {"seconds": seconds, "mb_per_sec": size_mb / seconds, "counts": counts}
+    return results
+
+
+def print_report(file_path, results):
+    print(f"{file_path}: {os.path.getsize(file_path) / 1e6:.0f} MB")
+    print(f"{'scanner':<14}{'seconds':>10}{'MB/s':>9}" + "".join(f"{category:>11}" for category in CATEGORY_LABELS))
+    for name, result in results.items():
+        print(
+            f"{name:<14}{result['seconds']:>10.2f}{result['mb_per_sec']:>9.1f}"
+            + "".join(f"{result['counts'][category]:>11}" for category in CATEGORY_LABELS)
+        )
+    print(f"Speedup: {results['five-pass']['seconds'] / results['single-pass']['seconds']:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the single-pass PII scanner with the five-pass scan")
+    parser.add_argument("--size-mb", type=int, default=1024, help="size of the synthetic log")
+    parser.add_argument("--file", help="benchmark on this file instead of a synthetic log")
+    parser.add_argument("--fixture-dir", default="benchmark_fixtures", help="fixtures are written once and reused")
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per scanner, the best is kept")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    parser.add_argument(
+        "--check-streaming", action="store_true",
+        help="only check that scanning long lines block by block finds what a scan of the whole buffer finds",
+    )
+    args = parser.parse_args()
+
+    if args.check_streaming:
+        block_sizes = [4097, 5000, 8192, 10007, 65536, 100003]
+        failed = check_streaming(long_line_data(1000000), block_sizes)
+        print(f"Block sizes with findings different from a whole-buffer scan: {failed or 'none'}")
+        sys.exit(1 if failed else 0)
+
+    if args.file:
+        file_path = args.file
+    else:
+        os.makedirs(args.fixture_dir, exist_ok=True)
+        file_path = fixture_path(args.fixture_dir, args.size_mb)
+    results = benchmark(file_path, args.repeat)
+    print_report(file_path, results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -216,3 +216,7 @@ org_names = [
 ]
 
 org_structure = ["inc.", "ltd.", "gmbh"]
+
+# Optional external dictionaries that replace the lists above, e.g.
+# {"first_names": "/data/first_names.txt"}: one entry per line, read on first use
+dictionary_files = {}
@@ -1,75 +1,1071 @@
 import pandas as pd
+import numpy as np
 import random
-import sys
+import argparse
+import csv
+import hashlib
+import io
+import json
+import itertools
 import os
+import secrets
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 import warnings
-from datetime import datetime, timedelta
+from token_cache import TokenCache, token_seed, token_value
+from token_vault import TokenVault
+from masking_profile import MaskingProfile
+from masking_plan import compile_plan, plan_problems, unique_columns
 from masking_functions import (
     mask_functions,
     mask_default,
     first_names,
     last_names,
     columns_to_mask,
+    parse_dictionaries,
+    use_dictionaries,
+    dictionary_paths,
 )
 warnings.filterwarnings('ignore')
 
+file_delimiter = "|"
+
+
+class LineRangeReader(io.RawIOBase):
+    # Read-only view of the bytes [start, end) of a file, used to hand pandas
+    # the data rows without the header/trailer lines skipped by NF/NL/NFL
+    def __init__(self, path, start, end):
+        self.file = open(path, "rb")
+        self.file.seek(start)
+        self.remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.remaining)
+        if size <= 0:
+            return 0
+        read = self.file.readinto(memoryview(buffer)[:size])
+        self.remaining -= read
+        return read
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+def read_rows(input_file, start, end, chunksize, delimiter, **read_csv_args):
+    # All columns are read as text so every chunk is written back with the same formatting
+    with io.TextIOWrapper(io.BufferedReader(LineRangeReader(input_file, start, end))) as reader:
+        yield from pd.read_csv(reader, sep=delimiter, dtype=str, chunksize=chunksize, **read_csv_args)
+
+
+def read_line_batches(input_file, start, end, batch_size):
+    # Raw lines of [start, end), line endings included, batch_size lines at a time
+    with io.BufferedReader(LineRangeReader(input_file, start, end), 1024 * 1024) as reader:
+        while True:
+            lines = list(itertools.islice(reader, batch_size))
+            if not lines:
+                return
+            yield lines
+
+
+def split_fields(lines, delimiter, last_field):
+    # Splits raw lines into fields, keeping each line ending to put back on unchanged;
+    # everything after last_field stays one unsplit field. Lines with a quote character
+    # are parsed as CSV, as pandas reads them, and marked to be written back as CSV
+    rows, endings, quoted = [], [], []
+    for line in lines:
+        body = line.rstrip(b"\r\n")
+        if b'"' in body:
+            rows.append(parse_quoted_line(body, delimiter))
+            quoted.append(True)
+        else:
+            rows.append(body.split(delimiter, last_field + 1))
+            quoted.append(False)
+        endings.append(line[len(body):])
+    return rows, endings, quoted
+
+
+def parse_quoted_line(body, delimiter):
+    try:
+        fields = next(csv.reader([body.decode()], delimiter=delimiter.decode(), strict=True))
+    except csv.Error:
+        # An open quote continues the field on the next line, which line batches cannot follow
+        raise ValueError(
+            f"quoted field running over a line break in {body[:80]!r}; mask this file without --passthrough"
+        )
+    return [field.encode() for field in fields]
+
+
+def join_fields(row, ending, delimiter, quoted):
+    # Quoted lines are written as to_csv would write them, so their unmasked fields may
+    # lose quotes they did not need; every other line gets its bytes back unchanged
+    if not quoted:
+        return delimiter.join(row) + ending
+    text = io.StringIO()
+    csv.writer(text, delimiter=delimiter.decode(), lineterminator="").writerow(field.decode() for field in row)
+    return text.getvalue().encode() + ending
+
+
+def parse_field(field):
+    # The values pandas would hand the masking functions: empty is NaN, '?' is None
+    if field == b"":
+        return np.nan
+    if field == b"?":
+        return None
+    return field.decode()
+
+
+def format_field(value):
+    # Masked values are written as to_csv would write them
+    if value is None or value != value:
+        return b""
+    return str(value).encode()
+
+
+def columns_to_load(columns, columns_to_mask):
+    # The masked columns of a file, plus the name columns FULL_NAME is rebuilt from
+    names = [name for name in columns if name in columns_to_mask and name != "FULL_NAME"]
+    if "FULL_NAME" in columns_to_mask and {"FULL_NAME", "FIRST_NAME", "LAST_NAME"} <= set(columns):
+        names += [name for name in ["FIRST_NAME", "LAST_NAME", "FULL_NAME"] if name not in names]
+    return names
+
+
+def columnar_format(path):
+    # Parquet and Arrow IPC files are masked column by column instead of as text
+    extension = os.path.splitext(path)[1].lower()
+    if extension in [".parquet", ".pq"]:
+        return "parquet"
+    if extension in [".arrow", ".feather", ".ipc"]:
+        return "arrow"
+    return None
+
+
+def arrow_frame(table, columns_to_mask):
+    # An Arrow table as the object columns mask_dataframe takes
+    frame = table.to_pandas().astype(object)
+    for name in unique_columns(columns_to_mask):
+        if name in frame.columns:
+            # Integer keys with nulls would come back as float
+            frame[name] = pd.Series(table.column(name).to_pylist(), dtype=object)
+    return frame
+
+
+def split_header_trailer(input_file, ignore_lines):
+    # Returns (first_line, last_line, start, end) where [start, end) holds the rows to mask
+    end = os.path.getsize(input_file)
+    first_line = last_line = b""
+    with open(input_file, "rb") as f:
+        if ignore_lines in ["NF", "NFL"]:
+            first_line = f.readline()
+        start = f.tell()
+        if ignore_lines in ["NL", "NFL"]:
+            # Walk back from the end of the file to the start of the last line
+            position = end - 1 if end > start else end
+            block_size = 64 * 1024
+            last_start = start
+            while position > start:
+                read_from = max(start, position - block_size)
+                f.seek(read_from)
+                newline = f.read(position - read_from).rfind(b"\n")
+                if newline != -1:
+                    last_start = read_from + newline + 1
+                    break
+                position = read_from
+            f.seek(last_start)
+            last_line = f.read()
+            end = last_start
+    return first_line, last_line, start, end
+
+
+def shard_byte_ranges(input_file, start, end, shards):
+    # Split [start, end) into roughly equal byte ranges that begin and end on line boundaries
+    boundaries = [start]
+    with open(input_file, "rb") as f:
+        for i in range(1, shards):
+            target = start + (end - start) * i // shards
+            f.seek(target - 1)
+            f.readline()
+            boundary = min(f.tell(), end)
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+    if end > boundaries[-1]:
+        boundaries.append(end)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def count_rows(input_file, start, end, block_size=1024 * 1024):
+    rows = 0
+    last_byte = b"\n"
+    with open(input_file, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(block_size, remaining))
+            if not block:
+                break
+            rows += block.count(b"\n")
+            last_byte = block[-1:]
+            remaining -= len(block)
+    # A final line without a trailing newline is still a row
+    return rows + (last_byte != b"\n")
+
+
+def hash_bytes(input_file, start, end, hasher, block_size=1024 * 1024):
+    # Feeds the bytes [start, end) of input_file to hasher
+    with open(input_file, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(block_size, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+    return hasher
+
+
+def checkpoint_settings(columns_to_mask, num_records, ignore_lines, vectorized, options):
+    # Fingerprint of everything that decides how rows were masked; a checkpoint
+    # written under other settings is not resumed. The keys themselves are not stored.
+    # options are the DataMasker's; the name dictionaries count by content
+    settings = {
+        "columns_to_mask": columns_to_mask,
+        "mask_functions": {column: function.__name__ for column, function in mask_functions.items()},
+        "num_records": num_records,
+        "ignore_lines": ignore_lines,
+        "vectorized": vectorized,
+        "seed": options["seed"],
+        "consistent_key": options["consistent_key"],
+        "vault_path": options["vault_path"] and os.path.abspath(options["vault_path"]),
+        # Without a seed or consistent key the permutation key is new on every run
+        "unique_key": options["unique_key"] if unique_columns(columns_to_mask) else None,
+        "dictionaries": {
+            pool_name: [path, hash_bytes(path, 0, os.path.getsize(path), hashlib.sha256()).hexdigest()]
+            for pool_name, path in dictionary_paths().items()
+        },
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def temp_part_file(output_file):
+    # Part files live next to the output so the final concatenation stays on one disk
+    fd, part_file = tempfile.mkstemp(prefix=".mask_part_", dir=os.path.dirname(os.path.abspath(output_file)))
+    os.close(fd)
+    return part_file
+
+
+def process_pool(pool, workers):
+    # The pool shared by a batch of files, or a pool for this file only
+    return nullcontext(pool) if pool is not None else ProcessPoolExecutor(max_workers=workers)
+
+
+def run_shards(worker, output, workers, *shard_args, pool=None):
+    # Runs worker over the shards in a process pool; each returns the path of its
+    # masked part file and its masking profile entries. The parts are appended to
+    # output in shard order and the profile entries of all shards are returned
+    profile_entries = []
+    with process_pool(pool, workers) as pool:
+        for part_file, entries in pool.map(worker, *shard_args):
+            with open(part_file, "rb") as part:
+                shutil.copyfileobj(part, output, 1024 * 1024)
+            os.remove(part_file)
+            profile_entries.extend(entries)
+    return profile_entries
+
+
+def seed_sequence(seed, *key):
+    # The same run seed and key always give the same stream, in any process
+    spawn_key = tuple(zlib.crc32(str(part).encode()) for part in key)
+    return np.random.SeedSequence(seed, spawn_key=spawn_key)
+
+
+def mask_shard(
+    input_file, part_file, start, end, columns, columns_to_mask, mask_limit, vectorized, chunksize, options, shard_index
+):
+    # Process pool entry point: masks the first mask_limit rows of one byte range
+    data_masker = shard_masker(options)
+    with open(part_file, "w") as out:
+        for chunk_index, chunk in enumerate(data_masker.read_chunks(input_file, start, end, chunksize, names=columns)):
+            data_masker.block = (shard_index, chunk_index)
+            chunk.replace('?', None, inplace=True)
+            to_mask = int(min(mask_limit, len(chunk)))
+            mask_limit -= to_mask
+            chunk = data_masker.mask_rows(chunk, to_mask, columns_to_mask, vectorized)
+            chunk.to_csv(out, index=False, sep=file_delimiter, header=False)
+    return part_file, data_masker.profile.to_list()
+
+
+# DataMasker of a worker process, kept with its token cache and vault connection
+# for every shard the process masks, including the shards of later files in a batch
+worker_masker = None
+
+
+def shard_masker(options):
+    global worker_masker
+    if worker_masker is None or worker_masker.options != options:
+        if worker_masker is not None:
+            worker_masker.close()
+        worker_masker = DataMasker(**options)
+    worker_masker.profile = MaskingProfile()
+    return worker_masker
+
+
+def unique_key_for(seed, consistent_key):
+    if consistent_key is not None:
+        return consistent_key
+    if seed is not None:
+        return f"seed:{seed}"
+    return secrets.token_hex(16)
+
+
+def dry_run_summary(report):
+    lines = [f"Problem: {problem}" for problem in report["problems"]]
+    lines.extend(f"Warning: {warning}" for warning in report.get("warnings", []))
+    if "columns" not in report:
+        return "\n".join(lines)
+    lines.append(f"{'column':<20}{'function':<28}{'us/row':>9}")
+    for column, cost in sorted(report["columns"].items(), key=lambda item: -item[1]["us_per_row"]):
+        lines.append(f"{str(column):<20}{cost['function']:<28}{cost['us_per_row']:>9.2f}")
+    estimated_time = f"Estimated time: {report['estimated_seconds']:.0f}s in one process"
+    if report["workers"] > 1:
+        estimated_time += f", {report['estimated_seconds_parallel']:.0f}s with {report['workers']} workers"
+    lines.extend(
+        [
+            f"Sampled {report['sampled_rows']} rows, about {report['estimated_rows']} in the file, "
+            f"{report['output_rows']} to write",
+            estimated_time,
+            f"Estimated output size: {report['estimated_output_bytes'] / 1e6:.1f} MB",
+        ]
+    )
+    # Parquet and Arrow IPC files are always masked a row group at a time
+    if "whole_file_memory_bytes" in report:
+        lines.append(
+            f"Whole-file masking needs about {report['whole_file_memory_bytes'] / 1e6:.0f} MB; "
+            f"--chunksize {report['suggested_chunksize']} keeps chunks near 256 MB"
+        )
+    return "\n".join(lines)
+
 
 class DataMasker:
-    def __init__(self):
+    def __init__(
+        self, seed=None, consistent_key=None, cache_size=1000000, vault_path=None, unique_key=None, dictionaries=None,
+    ):
         self.first_names = first_names
         self.last_names = last_names
+        # With a seed every column gets its own reproducible stream; block identifies
+        # the shard/chunk being masked so chunked and parallel runs repeat exactly too
+        self.seed = seed
+        self.block = ()
+        self.rng = np.random.default_rng(seed)
+        # With a consistent_key each input value is masked the same way everywhere
+        self.consistent_key = consistent_key
+        self.token_cache = TokenCache(cache_size)
+        # With a vault, tokens persist across runs and only unseen values get new ones
+        self.token_vault = TokenVault(vault_path) if vault_path else None
+        # Key of the permutations of columns with extra_params {"unique": True}; it follows
+        # consistent_key or the seed so shards, chunks and reruns agree, else it is per run
+        self.unique_key = unique_key or unique_key_for(seed, consistent_key)
+        # Name pools read from dictionary files, {pool_name: path}
+        self.dictionaries = dict(dictionaries or {})
+        use_dictionaries(self.dictionaries)
+        # (columns_to_mask, compiled plan) of the run in progress
+        self.plan = None
+        # Time, rows and values per column and masking function, written next to the output
+        self.profile = MaskingProfile()
+        # Masked values drawn by mask_distinct for values not already in the cache or vault
+        self.tokens_generated = 0
+        # Process pool kept open across the files of a batch; None starts one per file
+        self.pool = None
+        # Settings handed to the DataMasker built in each worker process
+        self.options = {
+            "seed": seed, "consistent_key": consistent_key, "cache_size": cache_size, "vault_path": vault_path,
+            "unique_key": self.unique_key, "dictionaries": self.dictionaries,
+        }
+
+    def close(self):
+        if self.token_vault is not None:
+            self.token_vault.close()
+
+    def stream(self, *key):
+        if self.seed is None:
+            return np.random.default_rng()
+        return np.random.default_rng(seed_sequence(self.seed, *key, *self.block))
+
+    def seed_column(self, column_name):
+        # Reseeds both the numpy generator (vectorized path) and the random module
+        # (per-cell masking functions) for column_name in the current block
+        if self.seed is None:
+            return
+        sequence = seed_sequence(self.seed, column_name, *self.block)
+        self.rng = np.random.default_rng(sequence)
+        random.seed(int(sequence.generate_state(1, np.uint64)[0]))
+
+    def mask_consistent(self, column_masker, value):
+        # The draw for a value is seeded from a keyed hash of it, so repeats across
+        # files and runs get the same masked value; the cache saves redrawing repeats
+        domain = column_masker.extra_params.get("token_domain", column_masker.column.upper())
+        cache_key = (domain, token_value(value))
+        if cache_key in self.token_cache:
+            return self.token_cache.get(cache_key)
+
+        state = random.getstate()
+        random.seed(token_seed(self.consistent_key, domain, value))
+        masked_number = column_masker.mask_value(value)
+        random.setstate(state)
+        self.token_cache.put(cache_key, masked_number)
+        return masked_number
+
+    def mask_value(self, column_masker, value):
+        if self.consistent_key is not None:
+            return self.mask_consistent(column_masker, value)
+        return column_masker.mask_value(value)
+
+    def mask_account_number(self, column_name, account_number, data_type, length, extra_params=None):
+        # One value masked on its own; masking a file compiles each column once instead
+        column_masker = compile_plan(
+            {column_name: (data_type, length, extra_params)}, mask_functions, unique_key=self.unique_key
+        )[0]
+        return self.mask_value(column_masker, account_number)
+
+    def mask_distinct(self, column_masker, values):
+        # Only distinct values are masked, then spread back over the rows
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=False)
+        masked = np.empty(len(uniques), dtype=object)
+        if self.token_vault is None:
+            misses = self.token_cache.misses
+            for i, value in enumerate(uniques):
+                masked[i] = self.mask_value(column_masker, value)
+            self.tokens_generated += self.token_cache.misses - misses
+            return masked[codes]
+
+        # Vault lookups are batched per column; the in-memory cache answers hot keys first
+        domain = column_masker.extra_params.get("token_domain", column_masker.column.upper())
+        keys = [token_value(value) for value in uniques]
+        uncached = [i for i, key in enumerate(keys) if (domain, key) not in self.token_cache]
+        for i in set(range(len(keys))).difference(uncached):
+            masked[i] = self.token_cache.get((domain, keys[i]))
+
+        found = self.token_vault.lookup(domain, [keys[i] for i in uncached])
+        new_tokens = {}
+        for i in uncached:
+            if keys[i] not in found:
+                new_tokens[keys[i]] = self.mask_value(column_masker, uniques[i])
+        if new_tokens:
+            self.tokens_generated += len(new_tokens)
+            found.update(self.token_vault.store(domain, new_tokens))
+        for i in uncached:
+            masked[i] = found[keys[i]]
+            self.token_cache.put((domain, keys[i]), masked[i])
+        return masked[codes]
+
+    def plan_for(self, columns_to_mask):
+        # columns_to_mask is compiled once and reused for every chunk of the run
+        if self.plan is None or self.plan[0] is not columns_to_mask:
+            self.plan = (columns_to_mask, compile_plan(columns_to_mask, mask_functions, unique_key=self.unique_key))
+        return self.plan[1]
+
+    def mask_dataframe(self, df_to_mask, columns_to_mask, vectorized=False):
+        for column_masker in self.plan_for(columns_to_mask):
+            column_name = column_masker.column
+            if column_name != "FULL_NAME" and column_name in df_to_mask.columns:
+                started = time.perf_counter()
+                generated = len(df_to_mask)
+                self.seed_column(column_name)
+                if column_masker.unique:
+                    # Permuted without the cache or vault: the key alone makes it consistent
+                    df_to_mask.loc[:, column_name] = column_masker.mask(df_to_mask[column_name].to_numpy(), self.rng)
+                elif self.consistent_key is not None or self.token_vault is not None:
+                    tokens_generated = self.tokens_generated
+                    values = df_to_mask[column_name].to_numpy()
+                    df_to_mask.loc[:, column_name] = self.mask_distinct(column_masker, values)
+                    generated = self.tokens_generated - tokens_generated
+                elif vectorized:
+                    df_to_mask.loc[:, column_name] = column_masker.mask(df_to_mask[column_name].to_numpy(), self.rng)
+                else:
+                    # One value at a time, with the type and function the plan resolved for the column
+                    df_to_mask.loc[:, column_name] = df_to_mask[column_name].apply(column_masker.mask_value)
+                self.profile.record(
+                    column_name, column_masker.function_name, len(df_to_mask), generated,
+                    time.perf_counter() - started,
+                )
+
+        if "FULL_NAME" in df_to_mask.columns:
+            started = time.perf_counter()
+            df_to_mask["FULL_NAME"] = (
+                df_to_mask["FIRST_NAME"] + " " + df_to_mask["LAST_NAME"]
+            )
+            self.profile.record(
+                "FULL_NAME", "first_name + last_name", len(df_to_mask), len(df_to_mask), time.perf_counter() - started
+            )
+
+        return df_to_mask
+
+    def mask_rows(self, chunk, to_mask, columns_to_mask, vectorized):
+        # Masks the first to_mask rows of chunk and leaves the rest untouched
+        if not to_mask:
+            return chunk
+        df_to_mask = self.mask_dataframe(chunk.head(to_mask), columns_to_mask, vectorized)
+        return pd.concat([df_to_mask, chunk.tail(len(chunk) - to_mask)])
 
-    def random_decimal(self, precision, scale):
-        integer_part = random.randint(0, 10 ** (precision - scale) - 1)
-        decimal_part = random.randint(10 ** (scale - 1), 10**scale - 1)
-        return float(f"{integer_part}.{decimal_part}")
-
-    def random_date(self, start_date="1900-01-01", end_date="2099-12-31"):
-        start = datetime.strptime(start_date, "%Y-%m-%d")
-        end = datetime.strptime(end_date, "%Y-%m-%d")
-        random_date = start + timedelta(days=random.randint(0, (end - start).days))
-        return random_date.strftime("%Y-%m-%d")
-    
-    def random_timestamp(self, start_timestamp="1900-01-01 00:00:00", end_timestamp="2099-12-31 23:59:59"):
-        start = datetime.strptime(start_timestamp, "%Y-%m-%d %H:%M:%S")
-        end = datetime.strptime(end_timestamp, "%Y-%m-%d %H:%M:%S")
-        random_time = start + timedelta(seconds=random.randint(0, int((end - start).total_seconds())))
-        return random_time.strftime("%Y-%m-%d %H:%M:%S:000000")
-
-    def mask_account_number(
-        self, column_name, account_number, data_type, length, extra_params=None
+    def read_chunks(self, input_file, start, end, chunksize, names=None):
+        header = None if names is not None else "infer"
+        return read_rows(input_file, start, end, chunksize, file_delimiter, names=names, header=header)
+
+    def mask_csv_chunked(
+        self, input_file, output_file, columns_to_mask, num_records, ignore_lines="NO", vectorized=True, chunksize=100000
+    ):
+        first_line, last_line, start, end = split_header_trailer(input_file, ignore_lines)
+        masked_remaining = num_records if num_records >= 0 else float("inf")
+        total_rows = 0
+
+        with open(output_file, "w") as out:
+            out.write(first_line.decode())
+
+            for chunk_index, chunk in enumerate(self.read_chunks(input_file, start, end, chunksize)):
+                self.block = (0, chunk_index)
+                # Replace '?' with None
+                chunk.replace('?', None, inplace=True)
+                total_rows += len(chunk)
+
+                to_mask = int(min(masked_remaining, len(chunk)))
+                masked_remaining -= to_mask
+                chunk = self.mask_rows(chunk, to_mask, columns_to_mask, vectorized)
+                chunk.to_csv(out, index=False, sep=file_delimiter, header=chunk_index == 0)
+                print(f"Processed {total_rows} rows")
+
+            if num_records > total_rows:
+                self.write_sampled_rows(
+                    out, input_file, start, end, total_rows, num_records - total_rows,
+                    columns_to_mask, vectorized, chunksize,
+                )
+
+            out.write(last_line.decode())
+
+    def mask_csv_parallel(
+        self, input_file, output_file, columns_to_mask, num_records, ignore_lines="NO", vectorized=True,
+        chunksize=100000, workers=None,
+    ):
+        workers = workers or os.cpu_count()
+        first_line, last_line, start, end = split_header_trailer(input_file, ignore_lines)
+        with open(input_file, "rb") as f:
+            f.seek(start)
+            header_line = f.readline()
+            start = f.tell()
+        columns = pd.read_csv(io.BytesIO(header_line), sep=file_delimiter, nrows=0).columns.tolist()
+
+        shards = shard_byte_ranges(input_file, start, end, workers)
+        starts = [shard_start for shard_start, _ in shards]
+        ends = [shard_end for _, shard_end in shards]
+
+        # Each shard masks the part of the first num_records rows that falls inside it
+        if num_records >= 0:
+            with process_pool(self.pool, workers) as pool:
+                shard_rows = list(pool.map(count_rows, [input_file] * len(shards), starts, ends))
+            rows_before = np.concatenate([[0], np.cumsum(shard_rows)[:-1]])
+            mask_limits = [max(0, min(rows, num_records - before)) for rows, before in zip(shard_rows, rows_before)]
+            total_rows = sum(shard_rows)
+        else:
+            mask_limits = [float("inf")] * len(shards)
+            total_rows = None
+
+        part_files = [temp_part_file(output_file) for _ in shards]
+        print(f"Masking {len(shards)} shards with {workers} workers")
+
+        with open(output_file, "wb") as out:
+            out.write(first_line)
+            out.write(header_line)
+            profile_entries = run_shards(
+                mask_shard, out, workers,
+                [input_file] * len(shards), part_files, starts, ends, [columns] * len(shards),
+                [columns_to_mask] * len(shards), mask_limits, [vectorized] * len(shards), [chunksize] * len(shards),
+                [self.options] * len(shards), range(len(shards)), pool=self.pool,
+            )
+        self.profile.merge(profile_entries)
+
+        if total_rows is not None and num_records > total_rows:
+            with open(output_file, "a") as out:
+                self.write_sampled_rows(
+                    out, input_file, start - len(header_line), end, total_rows, num_records - total_rows,
+                    columns_to_mask, vectorized, chunksize,
+                )
+        with open(output_file, "ab") as out:
+            out.write(last_line)
+
+    def sampled_counts(self, total_rows, extra_rows, chunksize):
+        # One multinomial draw splits the extra rows over the source chunks of
+        # chunksize rows, so sampling never holds more than a count per chunk
+        self.block = ()
+        chunk_rows = np.diff(np.append(np.arange(0, total_rows, chunksize), total_rows))
+        return self.stream("sampled rows").multinomial(extra_rows, chunk_rows / total_rows)
+
+    def sampled_batches(self, chunk_index, chunk_rows, count, chunksize):
+        # Positions (with replacement) of count rows drawn from one source chunk,
+        # at most chunksize at a time; each batch has its own seeded block
+        for batch_index, batch_start in enumerate(range(0, count, chunksize)):
+            self.block = ("sampled rows", chunk_index, batch_index)
+            yield self.stream("positions").integers(0, chunk_rows, size=min(chunksize, count - batch_start))
+
+    def write_sampled_rows(
+        self, out, input_file, start, end, total_rows, extra_rows, columns_to_mask, vectorized, chunksize
     ):
-        if extra_params is None:
-            extra_params = {}
-
-        column_name = column_name.upper()
-
-        if data_type.upper() in ["CHAR", "VARCHAR"]:
-            account_number = str(account_number)
-            mask_function = mask_functions.get(column_name, mask_default)
-            masked_number = mask_function(account_number, length, extra_params)
-        elif data_type.upper() == "DECIMAL":
-            precision, scale = length
-            masked_number = self.random_decimal(precision, scale)
-        elif data_type.upper() == "DATE":
-            masked_number = self.random_date()
-        elif data_type.upper() == "TIMESTAMP":
-            masked_number = self.random_timestamp()
-        elif data_type.upper() == "INTEGER":
-            if length is not None:
-                min_value = 10 ** (length - 1)
-                max_value = 10**length - 1
+        # Second pass for num_records beyond the file: sampled rows are generated and
+        # masked in batches, so any number of them can be streamed in bounded memory
+        counts = self.sampled_counts(total_rows, extra_rows, chunksize)
+        for chunk_index, chunk in enumerate(self.read_chunks(input_file, start, end, chunksize)):
+            if not counts[chunk_index]:
+                continue
+            chunk.replace('?', None, inplace=True)
+            for positions in self.sampled_batches(chunk_index, len(chunk), counts[chunk_index], chunksize):
+                sampled = self.mask_dataframe(chunk.iloc[positions], columns_to_mask, vectorized)
+                sampled.to_csv(out, index=False, sep=file_delimiter, header=False)
+
+    def mask_lines(self, lines, field_positions, columns_to_mask):
+        # Only the fields at field_positions are parsed and rewritten; every other byte of
+        # each line, delimiters and line ending included, is copied through as is
+        delimiter = file_delimiter.encode()
+        rows, endings, quoted = split_fields(lines, delimiter, max(field_positions.values()))
+        frame = pd.DataFrame(
+            {
+                name: [parse_field(row[i]) if i < len(row) else np.nan for row in rows]
+                for name, i in field_positions.items()
+            },
+            dtype=object,
+        )
+        frame = self.mask_dataframe(frame, columns_to_mask, vectorized=True)
+        for name, i in field_positions.items():
+            if name not in columns_to_mask:
+                continue
+            for row, value in zip(rows, frame[name].tolist()):
+                if i < len(row):
+                    row[i] = format_field(value)
+        return [join_fields(row, ending, delimiter, quoted) for row, ending, quoted in zip(rows, endings, quoted)]
+
+    def mask_csv_passthrough(
+        self, input_file, output_file, columns_to_mask, num_records, ignore_lines="NO", chunksize=100000
+    ):
+        first_line, last_line, start, end = split_header_trailer(input_file, ignore_lines)
+        with open(input_file, "rb") as f:
+            f.seek(start)
+            header_line = f.readline()
+            start = f.tell()
+        columns = next(csv.reader([header_line.rstrip(b"\r\n").decode()], delimiter=file_delimiter))
+        line_ending = header_line[len(header_line.rstrip(b"\r\n")):] or b"\n"
+
+        field_positions = {name: columns.index(name) for name in columns_to_load(columns, columns_to_mask)}
+
+        masked_remaining = num_records if num_records >= 0 else float("inf")
+        total_rows = 0
+        with open(output_file, "wb") as out:
+            out.write(first_line)
+            out.write(header_line)
+            for batch_index, lines in enumerate(read_line_batches(input_file, start, end, chunksize)):
+                self.block = (0, batch_index)
+                total_rows += len(lines)
+                to_mask = int(min(masked_remaining, len(lines)))
+                masked_remaining -= to_mask
+                if to_mask and field_positions:
+                    lines[:to_mask] = self.mask_lines(lines[:to_mask], field_positions, columns_to_mask)
+                out.writelines(lines)
+                print(f"Processed {total_rows} rows")
+
+            if total_rows and num_records > total_rows:
+                # Sampled rows are appended after the last row, which may have no newline of its own
+                if not lines[-1].endswith(b"\n"):
+                    out.write(line_ending)
+                counts = self.sampled_counts(total_rows, num_records - total_rows, chunksize)
+                for batch_index, lines in enumerate(read_line_batches(input_file, start, end, chunksize)):
+                    if not lines[-1].endswith(b"\n"):
+                        lines[-1] += line_ending
+                    for positions in self.sampled_batches(batch_index, len(lines), counts[batch_index], chunksize):
+                        picked = [lines[i] for i in positions]
+                        if field_positions:
+                            picked = self.mask_lines(picked, field_positions, columns_to_mask)
+                        out.writelines(picked)
+
+            out.write(last_line)
+
+    def mask_table(self, table, to_mask, names, columns_to_mask, vectorized, schema):
+        # Masks the first to_mask rows of the named columns of an Arrow table. Masked
+        # columns keep their type in schema where the masked values can be cast to it
+        import pyarrow as pa
+
+        frame = arrow_frame(table.select(names).slice(0, to_mask), columns_to_mask)
+        frame = self.mask_dataframe(frame, columns_to_mask, vectorized)
+        for name in names:
+            if name not in columns_to_mask:
+                continue
+            values = frame[name].to_numpy()
+            try:
+                masked = pa.array(values, from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # Mixed types, e.g. mask_acct keeping some input values, are written as text
+                masked = pa.array([None if x is None or x != x else str(x) for x in values], pa.string())
+            try:
+                masked = masked.cast(schema.field(name).type)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                pass
+            if to_mask < table.num_rows:
+                rest = table.column(name).slice(to_mask).combine_chunks().cast(masked.type)
+                masked = pa.concat_arrays([masked, rest])
+            index = table.schema.get_field_index(name)
+            table = table.set_column(index, pa.field(name, masked.type), masked)
+        return table
+
+    def mask_columnar(self, input_file, output_file, columns_to_mask, num_records, file_format, vectorized=True):
+        # Parquet row groups / Arrow IPC record batches are masked one at a time. Only the
+        # columns being masked are converted to pandas; the others are written back as read
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if file_format == "parquet":
+            reader = pq.ParquetFile(input_file)
+            schema = reader.schema_arrow
+            tables = (reader.read_row_group(i) for i in range(reader.num_row_groups))
+        else:
+            reader = pa.ipc.open_file(input_file)
+            schema = reader.schema
+            tables = (pa.Table.from_batches([reader.get_batch(i)]) for i in range(reader.num_record_batches))
+        names = columns_to_load(schema.names, columns_to_mask)
+
+        masked_remaining = num_records if num_records >= 0 else float("inf")
+        total_rows = 0
+        writer = output_schema = None
+        try:
+            for index, table in enumerate(tables):
+                self.block = (0, index)
+                total_rows += table.num_rows
+                to_mask = int(min(masked_remaining, table.num_rows))
+                masked_remaining -= to_mask
+                if to_mask and names:
+                    table = self.mask_table(table, to_mask, names, columns_to_mask, vectorized, output_schema or schema)
+                # The first group fixes the output schema; later groups are cast to it
+                if writer is None:
+                    output_schema = table.schema
+                    writer = self.columnar_writer(output_file, output_schema, file_format)
+                else:
+                    table = table.cast(output_schema)
+                writer.write_table(table)
+                print(f"Processed {total_rows} rows")
+            if writer is None:
+                writer = self.columnar_writer(output_file, schema, file_format)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    def columnar_writer(self, output_file, schema, file_format):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if file_format == "parquet":
+            return pq.ParquetWriter(output_file, schema)
+        return pa.ipc.new_file(output_file, schema)
+
+    def first_failing_value(self, column_masker, values):
+        # Masks the values one at a time to find the row a failing column masker stops at
+        for row, value in enumerate(values):
+            try:
+                column_masker.mask(np.array([value], dtype=object), self.rng)
+            except Exception as e:
+                return row, value, e
+        return None
+
+    def dry_run(
+        self, input_file, columns_to_mask, num_records, ignore_lines="NO", vectorized=False, sample_rows=10000,
+        workers=None, chunk_memory=256 * 1024 * 1024,
+    ):
+        # Masks the first sample_rows rows column by column without writing anything,
+        # reports configuration and data problems, and extrapolates the full run's
+        # time, output size and memory from the measured costs
+        problems = plan_problems(columns_to_mask, mask_functions)
+        file_format = columnar_format(input_file)
+        if file_format:
+            # Parquet and Arrow IPC files are sampled from their first row group, and
+            # masked vectorized a row group at a time as mask_columnar does
+            sample, read_seconds, file_rows = self.columnar_sample(
+                input_file, file_format, sample_rows, columns_to_mask
+            )
+            vectorized = True
+        else:
+            first_line, last_line, start, end = split_header_trailer(input_file, ignore_lines)
+            with open(input_file, "rb") as f:
+                f.seek(start)
+                header_line = f.readline()
+                sample_bytes = b"".join(itertools.islice(iter(f.readline, b""), sample_rows))
+                # A small file's sample can run into the trailer
+                if f.tell() > end:
+                    sample_bytes = sample_bytes[:end - start - len(header_line)]
+
+            started = time.perf_counter()
+            sample = pd.read_csv(io.BytesIO(header_line + sample_bytes), sep=file_delimiter, dtype=str)
+            sample.replace('?', None, inplace=True)
+            read_seconds = time.perf_counter() - started
+        rows = len(sample)
+        if not rows:
+            problems.append(f"{input_file} has no rows to sample")
+            return {"problems": problems}
+
+        for column in columns_to_mask:
+            if column != "FULL_NAME" and column not in sample.columns:
+                problems.append(f"column {column}: not in the header of {input_file}, it will not be masked")
+        if "FULL_NAME" in sample.columns and not {"FIRST_NAME", "LAST_NAME"} <= set(sample.columns):
+            problems.append("column FULL_NAME: rebuilt from FIRST_NAME and LAST_NAME, which are not both in the file")
+
+        # The sample is masked with the vault off and a scratch token cache, so a dry run
+        # stores no tokens anywhere; vault lookups are not part of the estimate
+        token_vault, token_cache = self.token_vault, self.token_cache
+        self.token_vault, self.token_cache = None, TokenCache(token_cache.max_size)
+        try:
+            columns = {}
+            # Masked values that do not fit the configured length are reported without failing the check
+            warnings_found = []
+            masked_sample = sample.copy()
+            for column, spec in columns_to_mask.items():
+                if column == "FULL_NAME" or column not in sample.columns:
+                    continue
+                try:
+                    column_masker = compile_plan({column: spec}, mask_functions, unique_key=self.unique_key)[0]
+                except Exception:
+                    # Already reported by plan_problems
+                    continue
+                frame = sample[[column]].copy()
+                try:
+                    # A few rows first, so lookup tables built on first use are not counted per row
+                    self.mask_dataframe(frame.head(10).copy(), {column: spec}, vectorized)
+                    started = time.perf_counter()
+                    frame = self.mask_dataframe(frame, {column: spec}, vectorized)
+                except Exception as e:
+                    failure = self.first_failing_value(column_masker, sample[column].to_numpy())
+                    if failure is not None:
+                        row, value, e = failure
+                        problems.append(
+                            f"column {column}: {column_masker.function_name} fails on row {row + 1} value {value!r}: {e}"
+                        )
+                    else:
+                        problems.append(f"column {column}: {column_masker.function_name} fails: {type(e).__name__}: {e}")
+                    continue
+                seconds = time.perf_counter() - started
+                masked_sample[column] = frame[column]
+                if column_masker.data_type in ["CHAR", "VARCHAR"] and isinstance(column_masker.length, int):
+                    longest = frame[column].dropna().astype(str).str.len().max()
+                    if longest > column_masker.length:
+                        warnings_found.append(
+                            f"column {column}: masked values up to {longest} characters, "
+                            f"longer than its length {column_masker.length}"
+                        )
+                columns[column] = {"function": column_masker.function_name, "us_per_row": seconds / rows * 1e6}
+        finally:
+            self.token_vault, self.token_cache = token_vault, token_cache
+
+        memory_per_row = sample.memory_usage(deep=True).sum() / rows
+        if file_format:
+            # No rows are generated beyond the file, and no workers are used; the output
+            # keeps the schema and encoding of the input, so it is about as large
+            if num_records > file_rows:
+                warnings_found.append(
+                    f"{input_file} has {file_rows} rows; rows beyond the file are not generated for {file_format} input"
+                )
+            masked_rows = file_rows if num_records == -1 else min(num_records, file_rows)
+            mask_seconds = sum(column["us_per_row"] for column in columns.values()) / 1e6 * masked_rows
+            # Writing is counted as costing as much as reading
+            io_seconds = 2 * read_seconds / rows * file_rows
+            return {
+                "problems": problems,
+                "warnings": warnings_found,
+                "sampled_rows": rows,
+                "estimated_rows": file_rows,
+                "output_rows": file_rows,
+                "columns": columns,
+                "estimated_seconds": mask_seconds + io_seconds,
+                "estimated_seconds_parallel": mask_seconds + io_seconds,
+                "workers": 1,
+                "estimated_output_bytes": os.path.getsize(input_file),
+            }
+
+        started = time.perf_counter()
+        output_bytes = len(masked_sample.to_csv(index=False, sep=file_delimiter, header=False).encode())
+        write_seconds = time.perf_counter() - started
+
+        # Rows in the file, from the average size of a sampled row when the sample is not the whole file
+        data_bytes = end - start - len(header_line)
+        total_rows = rows if len(sample_bytes) >= data_bytes else int(data_bytes / (len(sample_bytes) / rows))
+        output_rows = max(total_rows, num_records)
+        masked_rows = output_rows if num_records == -1 else num_records
+        mask_seconds = sum(column["us_per_row"] for column in columns.values()) / 1e6 * masked_rows
+        io_seconds = (read_seconds + write_seconds) / rows * output_rows
+        workers = workers or os.cpu_count()
+        return {
+            "problems": problems,
+            "warnings": warnings_found,
+            "sampled_rows": rows,
+            "estimated_rows": total_rows,
+            "output_rows": output_rows,
+            "columns": columns,
+            "estimated_seconds": mask_seconds + io_seconds,
+            "estimated_seconds_parallel": (mask_seconds + io_seconds) / workers,
+            "workers": workers,
+            "estimated_output_bytes": int(
+                len(first_line) + len(header_line) + output_bytes / rows * output_rows + len(last_line)
+            ),
+            # Peak memory of the pandas paths runs at about 1.5 times the size of the frame
+            "whole_file_memory_bytes": int(memory_per_row * output_rows * 1.5),
+            "suggested_chunksize": max(1000, int(chunk_memory / (memory_per_row * 1.5)) // 1000 * 1000),
+        }
+
+    def columnar_sample(self, input_file, file_format, sample_rows, columns_to_mask):
+        # The first sample_rows rows of the first row group (record batch) of a Parquet or
+        # Arrow IPC file as mask_table hands them to mask_dataframe, the seconds taken to
+        # read them and the rows in the file
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        started = time.perf_counter()
+        if file_format == "parquet":
+            reader = pq.ParquetFile(input_file)
+            file_rows = reader.metadata.num_rows
+            if reader.num_row_groups:
+                table = reader.read_row_group(0)
             else:
-                min_value = extra_params.get("min_value", 0)
-                max_value = extra_params.get("max_value", 2**31 - 1)
-            masked_number = random.randint(min_value, max_value)
+                table = reader.schema_arrow.empty_table()
         else:
-            masked_number = account_number
-        return masked_number
+            reader = pa.ipc.open_file(input_file)
+            file_rows = reader.count_rows()
+            if reader.num_record_batches:
+                table = pa.Table.from_batches([reader.get_batch(0)])
+            else:
+                table = reader.schema.empty_table()
+        table = table.slice(0, sample_rows)
+        read_seconds = time.perf_counter() - started
+        return arrow_frame(table, columns_to_mask), read_seconds, file_rows
+
+    def mask_file(
+        self, input_file, output_file, columns_to_mask, num_records, ignore_lines="NO", vectorized=False, chunksize=None,
+        workers=None, passthrough=False, incremental=False,
+    ):
+        # Parquet and Arrow IPC input is recognised by its extension, anything else is delimited text
+        file_format = columnar_format(input_file)
+        if file_format:
+            return self.mask_columnar(input_file, output_file, columns_to_mask, num_records, file_format, vectorized=True)
+        return self.mask_csv(
+            input_file, output_file, columns_to_mask, num_records, ignore_lines, vectorized, chunksize, workers,
+            passthrough, incremental,
+        )
+
+    def resumable_checkpoint(self, input_file, output_file, settings, end):
+        # Returns the checkpoint of the last run and a hasher over the input bytes it
+        # masked, or None when the run has to start over
+        checkpoint_file = f"{output_file}.checkpoint.json"
+        if not os.path.exists(checkpoint_file) or not os.path.exists(output_file):
+            return None
+        with open(checkpoint_file) as f:
+            checkpoint = json.load(f)
+        if checkpoint["settings"] != settings:
+            reason = "the masking settings changed"
+        elif os.path.getsize(output_file) != checkpoint["output_size"]:
+            reason = f"{output_file} changed since the last run"
+        elif end < checkpoint["input_offset"]:
+            reason = f"{input_file} is shorter than at the last run"
+        else:
+            hasher = hash_bytes(input_file, 0, checkpoint["input_offset"], hashlib.sha256())
+            if hasher.hexdigest() == checkpoint["prefix_sha256"]:
+                return checkpoint, hasher
+            reason = f"the first {checkpoint['rows']} rows of {input_file} changed"
+        print(f"Masking all of {input_file}: {reason}")
+        return None
+
+    def mask_csv_incremental(
+        self, input_file, output_file, columns_to_mask, num_records, ignore_lines="NO", vectorized=True, chunksize=100000
+    ):
+        # Masks only the rows appended to input_file since the last run and appends them
+        # to output_file, before the trailer. <output_file>.checkpoint.json records how far
+        # the input was masked and a hash of those bytes; if they changed, everything is
+        # masked again. Rows beyond the file are not generated in this mode
+        first_line, last_line, start, end = split_header_trailer(input_file, ignore_lines)
+        with open(input_file, "rb") as f:
+            f.seek(start)
+            header_line = f.readline()
+        columns = pd.read_csv(io.BytesIO(header_line), sep=file_delimiter, nrows=0).columns.tolist()
+        settings = checkpoint_settings(columns_to_mask, num_records, ignore_lines, vectorized, self.options)
+
+        resumed = self.resumable_checkpoint(input_file, output_file, settings, end)
+        if resumed is None:
+            with open(output_file, "wb") as out:
+                out.write(first_line)
+                out.write(header_line)
+                output_offset = out.tell()
+            input_offset = start + len(header_line)
+            rows = 0
+            hasher = hashlib.sha256()
+            hash_from = 0
+        else:
+            checkpoint, hasher = resumed
+            input_offset, rows, output_offset = checkpoint["input_offset"], checkpoint["rows"], checkpoint["output_offset"]
+            hash_from = input_offset
+            print(f"Resuming after {rows} rows of {input_file}")
+        hash_bytes(input_file, hash_from, end, hasher)
+
+        masked_remaining = max(0, num_records - rows) if num_records >= 0 else float("inf")
+        first_row = rows
+        with open(output_file, "r+b") as out:
+            # The trailer written by the last run is replaced by the new rows and the current trailer
+            out.truncate(output_offset)
+            out.seek(output_offset)
+            if end > input_offset:
+                chunks = self.read_chunks(input_file, input_offset, end, chunksize, names=columns)
+                for chunk_index, chunk in enumerate(chunks):
+                    self.block = (first_row, chunk_index)
+                    chunk.replace('?', None, inplace=True)
+                    to_mask = int(min(masked_remaining, len(chunk)))
+                    masked_remaining -= to_mask
+                    chunk = self.mask_rows(chunk, to_mask, columns_to_mask, vectorized)
+                    out.write(chunk.to_csv(index=False, sep=file_delimiter, header=False).encode())
+                    rows += len(chunk)
+                    print(f"Processed {rows} rows")
+            output_offset = out.tell()
+            out.write(last_line)
+            output_size = out.tell()
+
+        checkpoint = {
+            "input_file": input_file,
+            "input_offset": end,
+            "rows": rows,
+            "prefix_sha256": hasher.hexdigest(),
+            "output_offset": output_offset,
+            "output_size": output_size,
+            "settings": settings,
+        }
+        with open(f"{output_file}.checkpoint.json", "w") as f:
+            json.dump(checkpoint, f, indent=2)
 
     def mask_csv(
-        self, input_file, output_file, columns_to_mask, num_records, ignore_lines="NO"
+        self, input_file, output_file, columns_to_mask, num_records, ignore_lines="NO", vectorized=False, chunksize=None,
+        workers=None, passthrough=False, incremental=False,
     ):
+        if incremental:
+            return self.mask_csv_incremental(
+                input_file, output_file, columns_to_mask, num_records, ignore_lines, vectorized, chunksize or 100000
+            )
+        if passthrough:
+            return self.mask_csv_passthrough(
+                input_file, output_file, columns_to_mask, num_records, ignore_lines, chunksize or 100000
+            )
+        if workers and workers > 1:
+            return self.mask_csv_parallel(
+                input_file, output_file, columns_to_mask, num_records, ignore_lines, vectorized,
+                chunksize or 100000, workers,
+            )
+        if chunksize:
+            return self.mask_csv_chunked(
+                input_file, output_file, columns_to_mask, num_records, ignore_lines, vectorized, chunksize
+            )
+
         with open(input_file, "r") as f:
             lines = f.readlines()
 
@@ -87,14 +1083,17 @@ class DataMasker:
         with open("temp.csv", "w") as f:
             f.writelines(lines)
 
-        df = pd.read_csv("temp.csv", sep=file_delimiter)
+        df = pd.read_csv("temp.csv", sep=file_delimiter, dtype=dict.fromkeys(unique_columns(columns_to_mask), str))
 
         # Replace '?' with None
         df.replace('?', None, inplace=True)
 
         if num_records > len(df):
             extra_rows = num_records - len(df)
-            df = pd.concat([df] + [df.sample(n=1, replace=True) for _ in range(extra_rows)])
+            # All extra rows are sampled in one draw; for targets that do not fit in
+            # memory use --chunksize, which generates them in batches
+            sample_rng = self.stream("sampled rows")
+            df = pd.concat([df, df.sample(n=extra_rows, replace=True, random_state=sample_rng)])
 
         if num_records > 0:
             df_to_mask = df.head(num_records)
@@ -103,19 +1102,7 @@ class DataMasker:
             df_to_mask = df if num_records == -1 else pd.DataFrame(columns=df.columns)
             df_to_keep = df if num_records == 0 else pd.DataFrame(columns=df.columns)
 
-        for column_name, (data_type, length, extra_params) in columns_to_mask.items():
-            if column_name != "FULL_NAME" and column_name in df_to_mask.columns:
-                print(f"Masking data in column: {column_name}")
-                df_to_mask.loc[:, column_name] = df_to_mask[column_name].apply(
-                    lambda x: self.mask_account_number(
-                        column_name, x, data_type, length, extra_params
-                    )
-                )
-
-        if "FULL_NAME" in df_to_mask.columns:
-            df_to_mask["FULL_NAME"] = (
-                df_to_mask["FIRST_NAME"] + " " + df_to_mask["LAST_NAME"]
-            )
+        df_to_mask = self.mask_dataframe(df_to_mask, columns_to_mask, vectorized)
 
         df = pd.concat([df_to_mask, df_to_keep])
         df.to_csv("temp.csv", index=False, sep=file_delimiter)
@@ -137,12 +1124,74 @@ class DataMasker:
         os.remove("temp.csv")
 
 if __name__ == "__main__":
-    num_records = int(sys.argv[2])
-    input_file = sys.argv[3]
-    output_file = sys.argv[4]
-    file_delimiter = "|"
-
-    data_masker = DataMasker()
-    data_masker.mask_csv(
-        input_file, output_file, columns_to_mask, num_records, ignore_lines=sys.argv[1]
+    parser = argparse.ArgumentParser()
+    parser.add_argument("ignore_lines", help="NO, NF, NL or NFL (not used for .parquet/.arrow input)")
+    parser.add_argument("num_records", type=int)
+    parser.add_argument("input_file")
+    parser.add_argument("output_file")
+    parser.add_argument("--vectorized", action="store_true", help="mask whole columns at once with numpy")
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        help="stream the file in chunks of this many rows; rows beyond the file are generated in batches of this size",
+    )
+    parser.add_argument("--workers", type=int, help="mask shards of the file in this many processes")
+    parser.add_argument("--seed", type=int, help="make the masked output reproducible")
+    parser.add_argument(
+        "--dictionary",
+        action="append",
+        default=[],
+        metavar="POOL=PATH",
+        help="draw names for POOL (first_names, last_names, org_names, org_structure) from a file, one per line",
+    )
+    parser.add_argument(
+        "--passthrough",
+        action="store_true",
+        help="rewrite only the masked fields and copy every other byte of the file unchanged",
+    )
+    parser.add_argument(
+        "--consistent-key",
+        default=os.environ.get("MASK_TOKEN_KEY"),
+        help="secret key for consistent masking: equal values get equal masked values (default: $MASK_TOKEN_KEY)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="mask only the rows appended since the last run and append them to the output (no upsampling)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="check the config against a sample of the file and estimate time and output size, writing nothing",
+    )
+    parser.add_argument("--sample-rows", type=int, default=10000, help="rows masked by --dry-run")
+    parser.add_argument("--cache-size", type=int, default=1000000, help="token cache entries kept in memory")
+    parser.add_argument("--vault", help="SQLite token vault that keeps masked values consistent across runs")
+    args = parser.parse_args()
+
+    data_masker = DataMasker(
+        seed=args.seed, consistent_key=args.consistent_key, cache_size=args.cache_size, vault_path=args.vault,
+        dictionaries=parse_dictionaries(args.dictionary),
+    )
+    if args.dry_run:
+        report = data_masker.dry_run(
+            args.input_file, columns_to_mask, args.num_records, ignore_lines=args.ignore_lines,
+            vectorized=args.vectorized, sample_rows=args.sample_rows, workers=args.workers,
+        )
+        data_masker.close()
+        print(dry_run_summary(report))
+        sys.exit(1 if report["problems"] else 0)
+    data_masker.mask_file(
+        args.input_file,
+        args.output_file,
+        columns_to_mask,
+        args.num_records,
+        ignore_lines=args.ignore_lines,
+        vectorized=args.vectorized,
+        chunksize=args.chunksize,
+        workers=args.workers,
+        passthrough=args.passthrough,
+        incremental=args.incremental,
     )
+    data_masker.close()
+    data_masker.profile.write(args.output_file)
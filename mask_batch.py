@@ -0,0 +1,161 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from mask import DataMasker
+from masking_functions import columns_to_mask, parse_dictionaries
+
+# Masks many files in one process: pandas, the config and the name pools are loaded
+# once, and one DataMasker (token cache, vault, compiled plan) and one process pool
+# serve every file. A manifest is a JSON list of entries such as
+# {"input_file": "in/a.csv", "output_file": "out/a.csv", "ignore_lines": "NF", "num_records": -1}
+# where ignore_lines and num_records fall back to the command line defaults
+
+
+def read_manifest(manifest_file, ignore_lines, num_records):
+    with open(manifest_file) as f:
+        entries = json.load(f)
+    jobs = []
+    for entry in entries:
+        if "input_file" not in entry or "output_file" not in entry:
+            raise ValueError(f"{manifest_file}: every entry needs an input_file and an output_file, got {entry}")
+        jobs.append(
+            {
+                "input_file": entry["input_file"],
+                "output_file": entry["output_file"],
+                "ignore_lines": entry.get("ignore_lines", ignore_lines),
+                "num_records": int(entry.get("num_records", num_records)),
+            }
+        )
+    return jobs
+
+
+def glob_jobs(pattern, output_dir, ignore_lines, num_records):
+    # Each match is written to output_dir under its own file name
+    jobs = []
+    for input_file in sorted(glob.glob(pattern)):
+        output_file = os.path.join(output_dir, os.path.basename(input_file))
+        if os.path.abspath(output_file) == os.path.abspath(input_file):
+            raise ValueError(f"{input_file} would be overwritten, choose another --output-dir")
+        jobs.append(
+            {"input_file": input_file, "output_file": output_file, "ignore_lines": ignore_lines, "num_records": num_records}
+        )
+    return jobs
+
+
+def mask_batch(
+    data_masker, jobs, columns_to_mask, vectorized=False, chunksize=None, workers=None, passthrough=False,
+    incremental=False,
+):
+    # A file that fails is reported and the batch goes on with the next one
+    timings = []
+    with ProcessPoolExecutor(max_workers=workers) if workers and workers > 1 else nullcontext() as pool:
+        data_masker.pool = pool
+        try:
+            for job in jobs:
+                started = time.perf_counter()
+                error = None
+                try:
+                    output_dir = os.path.dirname(job["output_file"])
+                    if output_dir:
+                        os.makedirs(output_dir, exist_ok=True)
+                    data_masker.mask_file(
+                        job["input_file"], job["output_file"], columns_to_mask, job["num_records"],
+                        ignore_lines=job["ignore_lines"], vectorized=vectorized, chunksize=chunksize,
+                        workers=workers, passthrough=passthrough, incremental=incremental,
+                    )
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    print(f"Failed to mask {job['input_file']}: {error}")
+                timings.append(
+                    {
+                        **job,
+                        "bytes": os.path.getsize(job["input_file"]) if os.path.exists(job["input_file"]) else 0,
+                        "seconds": time.perf_counter() - started,
+                        "error": error,
+                    }
+                )
+        finally:
+            data_masker.pool = None
+    return timings
+
+
+def timings_summary(timings):
+    lines = [f"{'input_file':<40}{'MB':>10}{'seconds':>10}{'MB/s':>9}  status"]
+    for timing in timings:
+        mb = timing["bytes"] / 1e6
+        rate = mb / timing["seconds"] if timing["seconds"] else 0.0
+        status = "ok" if timing["error"] is None else "FAILED"
+        lines.append(f"{timing['input_file']:<40}{mb:>10.2f}{timing['seconds']:>10.2f}{rate:>9.2f}  {status}")
+    failed = sum(timing["error"] is not None for timing in timings)
+    lines.append(
+        f"{len(timings)} files, {failed} failed, {sum(timing['seconds'] for timing in timings):.2f}s masking"
+    )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mask a batch of files in one process")
+    inputs = parser.add_mutually_exclusive_group(required=True)
+    inputs.add_argument("--manifest", help="JSON list of input_file, output_file, ignore_lines, num_records entries")
+    inputs.add_argument("--glob", help="mask every file matching this pattern into --output-dir")
+    parser.add_argument("--output-dir", help="where --glob writes the masked files")
+    parser.add_argument("--ignore-lines", default="NO", help="NO, NF, NL or NFL for entries that do not set it")
+    parser.add_argument("--num-records", type=int, default=-1, help="for entries that do not set it; -1 masks all rows")
+    parser.add_argument("--vectorized", action="store_true", help="mask whole columns at once with numpy")
+    parser.add_argument("--chunksize", type=int, help="stream each file in chunks of this many rows")
+    parser.add_argument("--workers", type=int, help="mask shards of each file in one shared pool of this many processes")
+    parser.add_argument("--seed", type=int, help="make the masked output reproducible")
+    parser.add_argument(
+        "--dictionary",
+        action="append",
+        default=[],
+        metavar="POOL=PATH",
+        help="draw names for POOL (first_names, last_names, org_names, org_structure) from a file, one per line",
+    )
+    parser.add_argument(
+        "--passthrough",
+        action="store_true",
+        help="rewrite only the masked fields and copy every other byte of the file unchanged",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="mask only the rows appended to each file since the last run and append them to its output",
+    )
+    parser.add_argument(
+        "--consistent-key",
+        default=os.environ.get("MASK_TOKEN_KEY"),
+        help="secret key for consistent masking: equal values get equal masked values (default: $MASK_TOKEN_KEY)",
+    )
+    parser.add_argument("--cache-size", type=int, default=1000000, help="token cache entries shared by all files")
+    parser.add_argument("--vault", help="SQLite token vault that keeps masked values consistent across runs")
+    parser.add_argument("--report", default="mask_batch.report.json", help="per-file timings and masking profile")
+    args = parser.parse_args()
+    if args.glob and not args.output_dir:
+        parser.error("--glob needs --output-dir")
+
+    if args.manifest:
+        jobs = read_manifest(args.manifest, args.ignore_lines, args.num_records)
+    else:
+        jobs = glob_jobs(args.glob, args.output_dir, args.ignore_lines, args.num_records)
+
+    data_masker = DataMasker(
+        seed=args.seed, consistent_key=args.consistent_key, cache_size=args.cache_size, vault_path=args.vault,
+        dictionaries=parse_dictionaries(args.dictionary),
+    )
+    timings = mask_batch(
+        data_masker, jobs, columns_to_mask, vectorized=args.vectorized, chunksize=args.chunksize,
+        workers=args.workers, passthrough=args.passthrough, incremental=args.incremental,
+    )
+    data_masker.close()
+
+    with open(args.report, "w") as f:
+        json.dump({"files": timings, "columns": data_masker.profile.to_list()}, f, indent=2)
+    print(data_masker.profile.summary())
+    print(timings_summary(timings))
+    sys.exit(1 if any(timing["error"] is not None for timing in timings) else 0)
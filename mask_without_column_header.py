@@ -1,112 +1,315 @@
 import pandas as pd
+import numpy as np
 import random
-import sys
+import argparse
+import mmap
 import os
+import time
 import warnings
-from datetime import datetime, timedelta
+from mask import (
+    split_header_trailer,
+    shard_byte_ranges,
+    count_rows,
+    temp_part_file,
+    run_shards,
+    read_rows,
+    seed_sequence,
+    parse_field,
+    unique_key_for,
+)
+from masking_plan import compile_plan, unique_columns
+from masking_profile import MaskingProfile
 from masking_functions import (
     mask_functions,
     mask_default,
     first_names,
     last_names,
     columns_to_mask,
+    parse_dictionaries,
+    use_dictionaries,
 )
 
 warnings.filterwarnings("ignore")
 
+file_delimiter = "|"
+
+
+def mask_shard_no_header(
+    input_file, part_file, start, end, columns_to_mask, mask_limit, chunksize, seed, shard_index, vectorized,
+    unique_key=None, dictionaries=None,
+):
+    # Process pool entry point: masks the first mask_limit rows of one byte range
+    data_masker = DataMasker(seed, unique_key, dictionaries)
+    with open(part_file, "w") as out:
+        chunks = read_rows(input_file, start, end, chunksize, file_delimiter, header=None)
+        for chunk_index, chunk in enumerate(chunks):
+            data_masker.block = (shard_index, chunk_index)
+            chunk.replace("?", None, inplace=True)
+            to_mask = int(min(mask_limit, len(chunk)))
+            mask_limit -= to_mask
+            if to_mask:
+                df_to_mask = data_masker.mask_dataframe_no_header(
+                    chunk.head(to_mask), columns_to_mask, vectorized=vectorized
+                )
+                chunk = pd.concat([df_to_mask, chunk.tail(len(chunk) - to_mask)])
+            chunk.to_csv(out, index=False, sep=file_delimiter, header=False)
+    return part_file, data_masker.profile.to_list()
+
+
+def field_spans(data, positions, delimiter):
+    # Newline/delimiter index of a block of whole lines: for each column position,
+    # the rows that have that field and the [start, end) byte span of the field in them
+    line_ends = np.flatnonzero(data == ord("\n"))
+    if not len(line_ends) or line_ends[-1] != len(data) - 1:
+        line_ends = np.append(line_ends, len(data))
+    line_starts = np.concatenate([[0], line_ends[:-1] + 1])
+    # A line's content stops before its "\r\n" / "\n"
+    before_end = np.maximum(line_ends - 1, 0)
+    content_ends = line_ends - ((line_ends > line_starts) & (data[before_end] == ord("\r")))
+    delimiters = np.flatnonzero(data == ord(delimiter))
+    first_delimiter = np.searchsorted(delimiters, line_starts)
+    delimiter_counts = np.searchsorted(delimiters, line_ends) - first_delimiter
+    padded = np.append(delimiters, len(data))
+
+    spans = {}
+    for position in positions:
+        rows = np.flatnonzero(delimiter_counts >= position)
+        if position == 0:
+            starts = line_starts[rows]
+        else:
+            starts = padded[first_delimiter[rows] + position - 1] + 1
+        ends = np.where(
+            delimiter_counts[rows] > position, padded[first_delimiter[rows] + position], content_ends[rows]
+        )
+        spans[position] = (rows, starts, ends)
+    return len(line_starts), spans
+
+
+def field_strings(values):
+    # Masked values as the text written to the file: NaN/None are empty, numbers as to_csv writes them
+    values = np.asarray(values)
+    if values.dtype == object:
+        missing = pd.isna(values)
+        if missing.any():
+            values = values.copy()
+            values[missing] = ""
+    return values.astype(str).tolist()
+
+
+def encode_fields(strings):
+    # One encode for the whole column; fields never contain a newline
+    if not strings:
+        return []
+    return "\n".join(strings).encode().split(b"\n")
+
 
 class DataMasker:
-    def __init__(self):
+    def __init__(self, seed=None, unique_key=None, dictionaries=None):
         self.first_names = first_names
         self.last_names = last_names
+        self.seed = seed
+        self.block = ()
+        self.rng = np.random.default_rng(seed)
+        # Key of the permutations of columns with extra_params {"unique": True}
+        self.unique_key = unique_key or unique_key_for(seed, None)
+        # Name pools read from dictionary files, {pool_name: path}
+        self.dictionaries = dict(dictionaries or {})
+        use_dictionaries(self.dictionaries)
+        self.plan = None
+        self.profile = MaskingProfile()
 
-    def random_decimal(self, precision, scale):
-        integer_part = random.randint(0, 10 ** (precision - scale) - 1)
-        decimal_part = random.randint(10 ** (scale - 1), 10**scale - 1)
-        return float(f"{integer_part}.{decimal_part}")
+    def seed_column(self, column_position):
+        # Reproducible per-column stream for the current shard/chunk when a seed is set
+        if self.seed is not None:
+            sequence = seed_sequence(self.seed, column_position, *self.block)
+            self.rng = np.random.default_rng(sequence)
+            random.seed(int(sequence.generate_state(1)[0]))
 
-    def random_date(self, start_date="1900-01-01", end_date="2099-12-31"):
-        start = datetime.strptime(start_date, "%Y-%m-%d")
-        end = datetime.strptime(end_date, "%Y-%m-%d")
-        random_date = start + timedelta(days=random.randint(0, (end - start).days))
-        return random_date.strftime("%Y-%m-%d")
+    def plan_for(self, columns_to_mask):
+        # Mask functions are looked up by column position
+        if self.plan is None or self.plan[0] is not columns_to_mask:
+            self.plan = (
+                columns_to_mask,
+                compile_plan(columns_to_mask, mask_functions, upper_names=False, unique_key=self.unique_key),
+            )
+        return self.plan[1]
 
-    def random_timestamp(
-        self, start_timestamp="1900-01-01 00:00:00", end_timestamp="2099-12-31 23:59:59"
-    ):
-        start = datetime.strptime(start_timestamp, "%Y-%m-%d %H:%M:%S")
-        end = datetime.strptime(end_timestamp, "%Y-%m-%d %H:%M:%S")
-        random_time = start + timedelta(
-            seconds=random.randint(0, int((end - start).total_seconds()))
-        )
-        return random_time.strftime("%Y-%m-%d %H:%M:%S:000000")
+    def mask_account_number(self, column_name, account_number, data_type, length, extra_params=None):
+        # One value masked on its own, the mask function looked up by upper-cased column name
+        column_masker = compile_plan(
+            {column_name: (data_type, length, extra_params)}, mask_functions, unique_key=self.unique_key
+        )[0]
+        return column_masker.mask_value(account_number)
 
-    def mask_account_number(
-        self, column_name, account_number, data_type, length, extra_params=None
-    ):
-        if extra_params is None:
-            extra_params = {}
-
-        column_name = column_name.upper()
-
-        if data_type.upper() in ["CHAR", "VARCHAR"]:
-            account_number = str(account_number)
-            mask_function = mask_functions.get(column_name, mask_default)
-            masked_number = mask_function(account_number, length, extra_params)
-        elif data_type.upper() == "DECIMAL":
-            precision, scale = length
-            masked_number = self.random_decimal(precision, scale)
-        elif data_type.upper() == "DATE":
-            masked_number = self.random_date()
-        elif data_type.upper() == "TIMESTAMP":
-            masked_number = self.random_timestamp()
-        elif data_type.upper() == "INTEGER":
-            if length is not None:
-                min_value = 10 ** (length - 1)
-                max_value = 10**length - 1
+    def mask_account_number_no_header(self, column_name, account_number, data_type, length, extra_params=None):
+        # One value masked on its own, the mask function looked up by column position
+        column_masker = compile_plan(
+            {column_name: (data_type, length, extra_params)}, mask_functions, upper_names=False,
+            unique_key=self.unique_key,
+        )[0]
+        return column_masker.mask_value(account_number)
+
+    def mask_dataframe_no_header(self, df_to_mask, columns_to_mask, vectorized=False):
+        for column_masker in self.plan_for(columns_to_mask):
+            column_position = column_masker.column
+            started = time.perf_counter()
+            self.seed_column(column_position)
+            if vectorized or column_masker.unique:
+                df_to_mask.iloc[:, column_position] = column_masker.mask(
+                    df_to_mask.iloc[:, column_position].to_numpy(), self.rng
+                )
             else:
-                min_value = extra_params.get("min_value", 0)
-                max_value = extra_params.get("max_value", 2**31 - 1)
-            masked_number = random.randint(min_value, max_value)
-        else:
-            masked_number = account_number
-        return masked_number
+                # One value at a time, with the type and function the plan resolved for the column
+                df_to_mask.iloc[:, column_position] = df_to_mask.iloc[:, column_position].apply(column_masker.mask_value)
+            self.profile.record(
+                column_position, column_masker.function_name, len(df_to_mask), len(df_to_mask),
+                time.perf_counter() - started,
+            )
+        return df_to_mask
 
-    def mask_account_number_no_header(
-        self, column_name, account_number, data_type, length, extra_params=None
+    def mask_csv_no_header_parallel(
+        self, input_file, output_file, columns_to_mask, num_records, ignore_lines="NO", chunksize=100000, workers=None,
+        vectorized=False,
     ):
-        if extra_params is None:
-            extra_params = {}
-
-        if data_type.upper() in ["CHAR", "VARCHAR"]:
-            account_number = str(account_number)
-            mask_function = mask_functions.get(column_name, mask_default)
-            masked_number = mask_function(account_number, length, extra_params)
-        elif data_type.upper() == "DECIMAL":
-            precision, scale = length
-            masked_number = self.random_decimal(precision, scale)
-        elif data_type.upper() == "DATE":
-            masked_number = self.random_date()
-        elif data_type.upper() == "TIMESTAMP":
-            masked_number = self.random_timestamp()
-        elif data_type.upper() == "INTEGER":
-            if length is not None:
-                min_value = 10 ** (length - 1)
-                max_value = 10**length - 1
+        workers = workers or os.cpu_count()
+        first_line, last_line, start, end = split_header_trailer(input_file, ignore_lines)
+        shards = shard_byte_ranges(input_file, start, end, workers)
+        starts = [shard_start for shard_start, _ in shards]
+        ends = [shard_end for _, shard_end in shards]
+
+        # Each shard masks the part of the first num_records rows that falls inside it
+        mask_limits = [float("inf")] * len(shards)
+        if num_records >= 0:
+            rows_before = 0
+            for i, (shard_start, shard_end) in enumerate(shards):
+                rows = count_rows(input_file, shard_start, shard_end)
+                mask_limits[i] = max(0, min(rows, num_records - rows_before))
+                rows_before += rows
+
+        part_files = [temp_part_file(output_file) for _ in shards]
+        print(f"Masking {len(shards)} shards with {workers} workers")
+
+        with open(output_file, "wb") as out:
+            out.write(first_line)
+            profile_entries = run_shards(
+                mask_shard_no_header, out, workers,
+                [input_file] * len(shards), part_files, starts, ends, [columns_to_mask] * len(shards),
+                mask_limits, [chunksize] * len(shards), [self.seed] * len(shards), range(len(shards)),
+                [vectorized] * len(shards), [self.unique_key] * len(shards), [self.dictionaries] * len(shards),
+            )
+            out.write(last_line)
+        self.profile.merge(profile_entries)
+
+    def mask_block(self, block, columns_to_mask, mask_limit):
+        # Masks the configured positions of the first mask_limit lines of block (bytes of whole
+        # lines) and returns the masked bytes. Fields keeping their length are written over a
+        # copy of the block in one numpy assignment; others are spliced in between the untouched bytes
+        data = np.frombuffer(block, dtype=np.uint8)
+        plan = self.plan_for(columns_to_mask)
+        line_count, spans = field_spans(data, [column_masker.column for column_masker in plan], file_delimiter)
+        replacements = []
+        for column_masker in plan:
+            started = time.perf_counter()
+            rows, starts, ends = spans[column_masker.column]
+            keep = rows < mask_limit
+            starts, ends = starts[keep], ends[keep]
+            self.seed_column(column_masker.column)
+            if column_masker.reads_values:
+                values = [parse_field(block[start:end]) for start, end in zip(starts.tolist(), ends.tolist())]
             else:
-                min_value = extra_params.get("min_value", 0)
-                max_value = extra_params.get("max_value", 2**31 - 1)
-            masked_number = random.randint(min_value, max_value)
-        else:
-            masked_number = account_number
-        return masked_number
+                values = np.empty(len(starts), dtype=object)
+            masked = encode_fields(field_strings(column_masker.mask(values, self.rng)))
+            replacements.append((starts, ends, masked))
+            self.profile.record(
+                column_masker.column, column_masker.function_name, len(masked), len(masked),
+                time.perf_counter() - started,
+            )
+
+        widths = [ends - starts for starts, ends, _ in replacements]
+        same_width = all(
+            len(masked) == 0
+            or (np.all(width == width[0]) and np.all(np.fromiter(map(len, masked), np.int64, len(masked)) == width[0]))
+            for width, (_, _, masked) in zip(widths, replacements)
+        )
+        if same_width:
+            output = np.frombuffer(bytearray(block), dtype=np.uint8)
+            for width, (starts, _, masked) in zip(widths, replacements):
+                if len(masked) and width[0]:
+                    columns = starts[:, None] + np.arange(width[0])
+                    output[columns] = np.frombuffer(b"".join(masked), dtype=np.uint8).reshape(len(masked), width[0])
+            return output.tobytes(), line_count
+
+        # Untouched gaps and masked fields alternate once the fields are sorted by offset
+        starts = np.concatenate([starts for starts, _, _ in replacements])
+        ends = np.concatenate([ends for _, ends, _ in replacements])
+        masked = [value for _, _, values in replacements for value in values]
+        order = np.argsort(starts, kind="stable")
+        gap_starts = np.concatenate([[0], ends[order]]).tolist()
+        gap_ends = np.concatenate([starts[order], [len(block)]]).tolist()
+        pieces = [b""] * (2 * len(order) + 1)
+        pieces[0::2] = [block[gap_start:gap_end] for gap_start, gap_end in zip(gap_starts, gap_ends)]
+        pieces[1::2] = [masked[i] for i in order.tolist()]
+        return b"".join(pieces), line_count
+
+    def mask_csv_no_header_mmap(
+        self, input_file, output_file, columns_to_mask, num_records, ignore_lines="NO", block_size=64 * 1024 * 1024
+    ):
+        # The file is memory-mapped and indexed block by block; bytes outside the masked
+        # fields are never parsed, and lines past num_records are copied straight through
+        first_line, last_line, start, end = split_header_trailer(input_file, ignore_lines)
+        mask_limit = num_records if num_records >= 0 else float("inf")
+        total_rows = 0
+        with open(output_file, "wb") as out:
+            out.write(first_line)
+            if end > start:
+                with open(input_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    position = start
+                    block_index = 0
+                    while position < end and mask_limit > 0:
+                        newline = mapped.find(b"\n", min(position + block_size, end) - 1, end)
+                        block_end = end if newline == -1 else newline + 1
+                        self.block = (0, block_index)
+                        masked, line_count = self.mask_block(mapped[position:block_end], columns_to_mask, mask_limit)
+                        out.write(masked)
+                        total_rows += line_count
+                        mask_limit -= line_count
+                        position = block_end
+                        block_index += 1
+                        print(f"Processed {total_rows} rows")
+                    for offset in range(position, end, block_size):
+                        out.write(mapped[offset:min(offset + block_size, end)])
+            out.write(last_line)
+
+    def needs_upsampling(self, input_file, num_records, ignore_lines):
+        # True when num_records asks for more rows than the file has; only the
+        # pandas path adds the sampled extra rows
+        if num_records <= 0:
+            return False
+        _, _, start, end = split_header_trailer(input_file, ignore_lines)
+        return num_records > count_rows(input_file, start, end)
 
     def mask_csv_no_header(
-        self, input_file, output_file, columns_to_mask, num_records, ignore_lines="NO", header_present=None
+        self, input_file, output_file, columns_to_mask, num_records, ignore_lines="NO", header_present=None,
+        workers=None, vectorized=False, memory_map=False,
     ):
         print(header_present)
+        if (
+            header_present is not None
+            and (memory_map or (workers and workers > 1))
+            and self.needs_upsampling(input_file, num_records, ignore_lines)
+        ):
+            print(f"{num_records} records is more than {input_file} has; masking in one process to add the extra rows")
+            memory_map = False
+            workers = None
         if header_present is None:
             print("header is present hence no masking")
+        elif memory_map:
+            self.mask_csv_no_header_mmap(input_file, output_file, columns_to_mask, num_records, ignore_lines)
+        elif workers and workers > 1:
+            self.mask_csv_no_header_parallel(
+                input_file, output_file, columns_to_mask, num_records, ignore_lines, workers=workers,
+                vectorized=vectorized,
+            )
         else:
             with open(input_file, "r") as f:
                 lines = f.readlines()
@@ -125,16 +328,19 @@ class DataMasker:
             with open("temp.csv", "w") as f:
                 f.writelines(lines)
 
-            df = pd.read_csv("temp.csv", sep=file_delimiter, header=None)
+            df = pd.read_csv(
+                "temp.csv", sep=file_delimiter, header=None, dtype=dict.fromkeys(unique_columns(columns_to_mask), str)
+            )
 
             # Replace '?' with None
             df.replace("?", None, inplace=True)
 
             if num_records > len(df):
                 extra_rows = num_records - len(df)
-                df = pd.concat(
-                    [df] + [df.sample(n=1, replace=True) for _ in range(extra_rows)]
-                )
+                sample_rng = None
+                if self.seed is not None:
+                    sample_rng = np.random.default_rng(seed_sequence(self.seed, "sampled rows"))
+                df = pd.concat([df, df.sample(n=extra_rows, replace=True, random_state=sample_rng)])
 
             if num_records > 0:
                 df_to_mask = df.head(num_records)
@@ -143,19 +349,7 @@ class DataMasker:
                 df_to_mask = df if num_records == -1 else pd.DataFrame(columns=df.columns)
                 df_to_keep = df if num_records == 0 else pd.DataFrame(columns=df.columns)
 
-            for column_position, (
-                data_type,
-                length,
-                extra_params,
-            ) in columns_to_mask.items():
-                print(f"Masking data in column: {column_position}")
-                df_to_mask.iloc[:, column_position] = df_to_mask.iloc[
-                    :, column_position
-                ].apply(
-                    lambda x: self.mask_account_number_no_header(
-                        column_position, x, data_type, length, extra_params
-                    )
-                )
+            df_to_mask = self.mask_dataframe_no_header(df_to_mask, columns_to_mask, vectorized=vectorized)
 
             #df_to_mask[10] = (df_to_mask[6] + " " + df_to_mask[7]) # to add full name in the column when column positions are given.
 
@@ -180,13 +374,39 @@ class DataMasker:
 
 
 if __name__ == "__main__":
-    num_records = int(sys.argv[2])
-    input_file = sys.argv[3]
-    output_file = sys.argv[4]
-    file_delimiter = "|"
-    header_present = sys.argv[5] if len(sys.argv) > 5 else None
+    parser = argparse.ArgumentParser()
+    parser.add_argument("ignore_lines", help="NO, NF, NL or NFL")
+    parser.add_argument("num_records", type=int)
+    parser.add_argument("input_file")
+    parser.add_argument("output_file")
+    parser.add_argument("header_present", nargs="?")
+    parser.add_argument("--vectorized", action="store_true", help="mask whole columns at once with numpy")
+    parser.add_argument("--workers", type=int, help="mask shards of the file in this many processes")
+    parser.add_argument("--seed", type=int, help="make the masked output reproducible")
+    parser.add_argument(
+        "--dictionary",
+        action="append",
+        default=[],
+        metavar="POOL=PATH",
+        help="draw names for POOL (first_names, last_names, org_names, org_structure) from a file, one per line",
+    )
+    parser.add_argument(
+        "--mmap",
+        action="store_true",
+        help="memory-map the file and rewrite only the masked fields, copying every other byte as is",
+    )
+    args = parser.parse_args()
 
-    data_masker = DataMasker()
+    data_masker = DataMasker(seed=args.seed, dictionaries=parse_dictionaries(args.dictionary))
     data_masker.mask_csv_no_header(
-        input_file, output_file, columns_to_mask, num_records, ignore_lines=sys.argv[1], header_present=header_present
+        args.input_file,
+        args.output_file,
+        columns_to_mask,
+        args.num_records,
+        ignore_lines=args.ignore_lines,
+        header_present=args.header_present,
+        workers=args.workers,
+        vectorized=args.vectorized,
+        memory_map=args.mmap,
     )
+    data_masker.profile.write(args.output_file)
@@ -1,6 +1,46 @@
 import random
 import string
-from config import first_names, last_names, org_structure, org_names
+import numpy as np
+from config import first_names, last_names, org_structure, org_names, dictionary_files
+from name_pools import NamePool, DictionaryPool
+
+# The config lists loaded once as deduplicated pools, by the name of the config list
+config_pools = {
+    "first_names": NamePool(first_names),
+    "last_names": NamePool(last_names),
+    "org_names": NamePool(org_names),
+    "org_structure": NamePool(org_structure),
+}
+name_pools = dict(config_pools)
+
+
+def parse_dictionaries(options):
+    # --dictionary POOL=PATH options as {pool_name: path}
+    return dict(option.partition("=")[::2] for option in options)
+
+
+def use_dictionaries(dictionaries):
+    # Draws each name pool from its dictionary file ({pool_name: path}, over the
+    # dictionary_files of the config), read on first use, or else from its config
+    # list. Called by every DataMasker, so worker processes draw from the same pools
+    # under any start method; a pool already reading its file keeps what it loaded
+    unknown = set(dictionaries).difference(config_pools)
+    if unknown:
+        raise ValueError(f"unknown name pool {sorted(unknown)}, expected one of {sorted(config_pools)}")
+    for pool_name, pool in config_pools.items():
+        path = dictionaries.get(pool_name, dictionary_files.get(pool_name))
+        if path is None:
+            name_pools[pool_name] = pool
+        elif not (isinstance(name_pools[pool_name], DictionaryPool) and name_pools[pool_name].path == path):
+            name_pools[pool_name] = DictionaryPool(path)
+
+
+use_dictionaries({})
+
+
+def dictionary_paths():
+    # {pool_name: path} of the name pools drawn from dictionary files
+    return {pool_name: pool.path for pool_name, pool in name_pools.items() if isinstance(pool, DictionaryPool)}
 
 
 def mask_add_values(account_number, length, extra_params):
@@ -19,32 +59,32 @@ def mask_only_allowed_values(account_number, length, extra_params):
 def mask_dea_name(account_number, length, extra_params):
     acc_no = "".join(random.choices(string.digits, k=length))
     separator = extra_params.get("separator", "-")
-    first_name = random.choice(first_names).upper()
-    last_name = random.choice(last_names).upper()
+    first_name = name_pools["first_names"].choice(upper=True)
+    last_name = name_pools["last_names"].choice(upper=True)
     return f"{acc_no}{separator}{first_name} {separator}{last_name}"
 
 def mask_et_loan_no(account_number, length, extra_params):
     return random.randint(410000, 490000)
 
 def mask_first_name(account_number, length, extra_params):
-    return random.choice(first_names)
+    return name_pools["first_names"].choice()
 
 
 def mask_last_name(account_number, length, extra_params):
-    return random.choice(last_names)
+    return name_pools["last_names"].choice()
 
 
 def mask_any_name(account_number, length, extra_params):
     separator = extra_params.get("separator", " ")
-    first_name = random.choice(first_names)
-    last_name = random.choice(last_names)
+    first_name = name_pools["first_names"].choice()
+    last_name = name_pools["last_names"].choice()
     return f"{first_name}{separator}{last_name}"
 
 
 def mask_org_name(account_number, length, extra_params):
     separator = extra_params.get("separator", " ")
-    first_name = random.choice(org_names)
-    last_name = random.choice(org_structure)
+    first_name = name_pools["org_names"].choice()
+    last_name = name_pools["org_structure"].choice()
     return f"{first_name}{separator}{last_name}"
 
 
@@ -63,6 +103,118 @@ def mask_default(account_number, length, extra_params):
         return "".join(random.choices(string.ascii_uppercase + string.digits, k=length))
 
 
+ALPHANUMERIC = string.ascii_uppercase + string.digits
+
+
+# Vectorized counterparts: each takes the whole column and a numpy Generator
+# and returns an array of masked values in the same format as the per-cell function
+def random_strings(rng, alphabet, n, length):
+    if not length:
+        return np.full(n, "", dtype=object)
+    codes = np.frombuffer(alphabet.encode("ascii"), dtype=np.uint8)
+    chars = codes[rng.integers(0, len(codes), size=(n, length))]
+    return chars.view(f"S{length}").ravel().astype(str).astype(object)
+
+
+def as_strings(values):
+    # Same conversion as str(x) per cell: NaN -> "nan", None -> "None"
+    return np.asarray(values, dtype=object).astype(str).astype(object)
+
+
+def mask_add_values_vectorized(values, length, extra_params, rng):
+    values = as_strings(values)
+    is_nan = values == "nan"
+    masked = np.full(len(values), "", dtype=object)
+    numbers = np.trunc(values[~is_nan].astype(float)).astype(np.int64) + 1000
+    masked[~is_nan] = numbers.astype(str)
+    return masked
+
+
+def mask_only_allowed_values_vectorized(values, length, extra_params, rng):
+    allowed_values = np.asarray(extra_params.get("allowed_values"), dtype=object)
+    return allowed_values[rng.integers(0, len(allowed_values), size=len(values))]
+
+
+def mask_dea_name_vectorized(values, length, extra_params, rng):
+    n = len(values)
+    acc_no = random_strings(rng, string.digits, n, length)
+    separator = extra_params.get("separator", "-")
+    first_name = name_pools["first_names"].draw(rng, n, upper=True)
+    last_name = name_pools["last_names"].draw(rng, n, upper=True)
+    return acc_no + separator + first_name + " " + separator + last_name
+
+
+def mask_et_loan_no_vectorized(values, length, extra_params, rng):
+    return rng.integers(410000, 490000, size=len(values), endpoint=True)
+
+
+def mask_first_name_vectorized(values, length, extra_params, rng):
+    return name_pools["first_names"].draw(rng, len(values))
+
+
+def mask_last_name_vectorized(values, length, extra_params, rng):
+    return name_pools["last_names"].draw(rng, len(values))
+
+
+def mask_any_name_vectorized(values, length, extra_params, rng):
+    separator = extra_params.get("separator", " ")
+    first_name = mask_first_name_vectorized(values, length, extra_params, rng)
+    last_name = mask_last_name_vectorized(values, length, extra_params, rng)
+    return first_name + separator + last_name
+
+
+def mask_org_name_vectorized(values, length, extra_params, rng):
+    separator = extra_params.get("separator", " ")
+    first_name = name_pools["org_names"].draw(rng, len(values))
+    last_name = name_pools["org_structure"].draw(rng, len(values))
+    return first_name + separator + last_name
+
+
+def mask_acct_vectorized(values, length, extra_params, rng):
+    values = as_strings(values)
+    masked = random_strings(rng, ALPHANUMERIC, len(values), length)
+    keep = np.array([len(x) != length for x in values], dtype=bool)
+    masked[keep] = values[keep]
+    return masked
+
+
+def mask_integer_vectorized(values, length, extra_params, rng):
+    return random_strings(rng, string.digits, len(values), length)
+
+
+def mask_default_vectorized(values, length, extra_params, rng):
+    return random_strings(rng, ALPHANUMERIC, len(values), length)
+
+
+vectorized_mask_functions = {
+    mask_add_values: mask_add_values_vectorized,
+    mask_only_allowed_values: mask_only_allowed_values_vectorized,
+    mask_dea_name: mask_dea_name_vectorized,
+    mask_et_loan_no: mask_et_loan_no_vectorized,
+    mask_first_name: mask_first_name_vectorized,
+    mask_last_name: mask_last_name_vectorized,
+    mask_any_name: mask_any_name_vectorized,
+    mask_org_name: mask_org_name_vectorized,
+    mask_acct: mask_acct_vectorized,
+    mask_integer: mask_integer_vectorized,
+    mask_default: mask_default_vectorized,
+}
+
+
+# Masking functions whose output depends on the value being masked; the others
+# only need to know how many values to generate
+value_dependent_functions = {mask_add_values, mask_acct}
+
+
+# Alphabets of the masking functions that can mask a key column with
+# extra_params {"unique": True}: a keyed permutation of the values of that format
+unique_alphabets = {
+    mask_acct: ALPHANUMERIC,
+    mask_default: ALPHANUMERIC,
+    mask_integer: string.digits,
+}
+
+
 # Defining columns to be treated special 
 mask_functions = {
     "GENDER": mask_only_allowed_values,
@@ -74,6 +226,11 @@ mask_functions = {
     "SIN": mask_integer,
 }
 
+# DATE and TIMESTAMP columns take an optional range in extra_params, e.g.
+# {"start_date": "2000-01-01", "end_date": "2024-12-31"} or
+# {"start_timestamp": "2000-01-01 00:00:00", "end_timestamp": "2024-12-31 23:59:59"}
+# Key columns (INTEGER, or masked with mask_acct, mask_integer or mask_default) take
+# {"unique": True} to keep distinct values distinct, e.g. "ACCT": ("VARCHAR", 10, {"unique": True})
 columns_to_mask = {
     "ACCT": ("VARCHAR", 10, None),
     "GENDER": ("VARCHAR", 2, {"allowed_values": ["F", "M"]}),
@@ -0,0 +1,499 @@
+import hashlib
+import hmac
+import math
+import random
+import re
+from datetime import datetime, timedelta
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from masking_functions import (
+    mask_acct,
+    mask_dea_name,
+    mask_default,
+    mask_integer,
+    mask_only_allowed_values,
+    unique_alphabets,
+    value_dependent_functions,
+    vectorized_mask_functions,
+)
+
+
+# A masking plan is columns_to_mask compiled once into a list of column maskers.
+# Each masker has its data type resolved and its bounds precomputed, so masking a
+# batch is one mask(values, rng) call per column with no per-row branching.
+# mask_value(value) masks one value with the random module, as the per-cell mode
+# and consistent masking draw them.
+class ColumnMasker:
+    # Name the column's masking is reported under in the masking profile
+    function_name = "unmasked"
+    # Whether mask() looks at the input values or only at how many there are
+    reads_values = True
+    # Whether distinct input values always get distinct masked values
+    unique = False
+
+    def __init__(self, column, data_type, length, extra_params):
+        self.column = column
+        self.data_type = data_type
+        self.length = length
+        self.extra_params = extra_params
+
+    def mask(self, values, rng):
+        return values
+
+    def mask_value(self, value):
+        return value
+
+
+class StringColumnMasker(ColumnMasker):
+    def __init__(self, column, data_type, length, extra_params, mask_function):
+        super().__init__(column, data_type, length, extra_params)
+        self.mask_function = mask_function
+        self.function_name = mask_function.__name__
+        self.vectorized_function = vectorized_mask_functions.get(mask_function)
+        self.reads_values = self.vectorized_function is None or mask_function in value_dependent_functions
+
+    def mask(self, values, rng):
+        if self.vectorized_function is None:
+            return [self.mask_function(str(x), self.length, self.extra_params) for x in values]
+        return self.vectorized_function(np.asarray(values, dtype=object), self.length, self.extra_params, rng)
+
+    def mask_value(self, value):
+        return self.mask_function(str(value), self.length, self.extra_params)
+
+
+class DecimalColumnMasker(ColumnMasker):
+    function_name = "random_decimal"
+    reads_values = False
+
+    def __init__(self, column, data_type, length, extra_params):
+        super().__init__(column, data_type, length, extra_params)
+        precision, scale = length
+        self.integer_high = 10 ** (precision - scale) - 1
+        self.decimal_low = 10 ** (scale - 1)
+        self.decimal_high = 10**scale - 1
+        self.divisor = 10**scale
+
+    def mask(self, values, rng):
+        integer_part = rng.integers(0, self.integer_high, size=len(values), endpoint=True)
+        decimal_part = rng.integers(self.decimal_low, self.decimal_high, size=len(values), endpoint=True)
+        # Exact integer division rounds the same way as float(f"{integer_part}.{decimal_part}")
+        return (integer_part * self.divisor + decimal_part) / self.divisor
+
+    def mask_value(self, value):
+        integer_part = random.randint(0, self.integer_high)
+        decimal_part = random.randint(self.decimal_low, self.decimal_high)
+        return float(f"{integer_part}.{decimal_part}")
+
+
+# Ranges up to this many days are formatted once into a lookup table; wider ones
+# are formatted per batch with numpy instead
+MAX_TABLE_DAYS = 1000000
+
+
+@lru_cache(maxsize=None)
+def date_bounds(start_date, end_date):
+    # Parsed (start, days in range) for DateColumnMasker.mask_value
+    start = datetime.strptime(start_date, "%Y-%m-%d").date()
+    return start, (datetime.strptime(end_date, "%Y-%m-%d").date() - start).days
+
+
+@lru_cache(maxsize=None)
+def timestamp_bounds(start_timestamp, end_timestamp):
+    # Parsed (start, seconds in range) for TimestampColumnMasker.mask_value
+    start = datetime.strptime(start_timestamp, "%Y-%m-%d %H:%M:%S")
+    return start, int((datetime.strptime(end_timestamp, "%Y-%m-%d %H:%M:%S") - start).total_seconds())
+
+
+@lru_cache(maxsize=None)
+def day_strings(start, days):
+    # "YYYY-MM-DD" for every day of a range, drawn by index instead of formatted per value
+    return np.datetime_as_string(start + np.arange(days + 1), unit="D").astype(object)
+
+
+@lru_cache(maxsize=None)
+def time_of_day_strings():
+    # " HH:MM:SS:000000" for every second of a day
+    return np.array(
+        [f" {second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d}:000000" for second in range(86400)],
+        dtype=object,
+    )
+
+
+class DateColumnMasker(ColumnMasker):
+    function_name = "random_date"
+    reads_values = False
+
+    def __init__(self, column, data_type, length, extra_params):
+        super().__init__(column, data_type, length, extra_params)
+        start_date = extra_params.get("start_date", "1900-01-01")
+        end_date = extra_params.get("end_date", "2099-12-31")
+        self.start = np.datetime64(start_date, "D")
+        self.days = (np.datetime64(end_date, "D") - self.start).astype(np.int64)
+        self.table = day_strings(self.start, self.days) if self.days < MAX_TABLE_DAYS else None
+        self.bounds = date_bounds(start_date, end_date)
+
+    def mask(self, values, rng):
+        days = rng.integers(0, self.days, size=len(values), endpoint=True)
+        if self.table is not None:
+            return self.table[days]
+        return np.datetime_as_string(self.start + days, unit="D").astype(object)
+
+    def mask_value(self, value):
+        start, days = self.bounds
+        return (start + timedelta(days=random.randint(0, days))).isoformat()
+
+
+class TimestampColumnMasker(ColumnMasker):
+    function_name = "random_timestamp"
+    reads_values = False
+
+    def __init__(self, column, data_type, length, extra_params):
+        super().__init__(column, data_type, length, extra_params)
+        start = extra_params.get("start_timestamp", "1900-01-01 00:00:00")
+        end = extra_params.get("end_timestamp", "2099-12-31 23:59:59")
+        self.start = np.datetime64(start.replace(" ", "T"), "s")
+        self.seconds = (np.datetime64(end.replace(" ", "T"), "s") - self.start).astype(np.int64)
+        # Offsets are split into (day, second of day) relative to midnight of the start day
+        self.start_day = self.start.astype("datetime64[D]")
+        self.start_second = (self.start - self.start_day).astype(np.int64)
+        days = (self.start_second + self.seconds) // 86400
+        self.table = day_strings(self.start_day, days) if days < MAX_TABLE_DAYS else None
+        self.bounds = timestamp_bounds(start, end)
+
+    def mask(self, values, rng):
+        seconds = rng.integers(0, self.seconds, size=len(values), endpoint=True)
+        if self.table is not None:
+            days, second_of_day = np.divmod(seconds + self.start_second, 86400)
+            return self.table[days] + time_of_day_strings()[second_of_day]
+        stamps = np.char.replace(np.datetime_as_string(self.start + seconds, unit="s"), "T", " ")
+        return np.char.add(stamps, ":000000").astype(object)
+
+    def mask_value(self, value):
+        start, seconds = self.bounds
+        return (start + timedelta(seconds=random.randint(0, seconds))).isoformat(" ") + ":000000"
+
+
+class IntegerColumnMasker(ColumnMasker):
+    function_name = "random_integer"
+    reads_values = False
+
+    def __init__(self, column, data_type, length, extra_params):
+        super().__init__(column, data_type, length, extra_params)
+        if length is not None:
+            self.min_value = 10 ** (length - 1)
+            self.max_value = 10**length - 1
+        else:
+            self.min_value = extra_params.get("min_value", 0)
+            self.max_value = extra_params.get("max_value", 2**31 - 1)
+        self.fits_int64 = self.max_value <= np.iinfo(np.int64).max
+
+    def mask(self, values, rng):
+        if not self.fits_int64:
+            return [random.randint(self.min_value, self.max_value) for _ in range(len(values))]
+        return rng.integers(self.min_value, self.max_value, size=len(values), endpoint=True)
+
+    def mask_value(self, value):
+        return random.randint(self.min_value, self.max_value)
+
+
+# Largest permutation domain: both Feistel halves stay below 2**31, so every
+# intermediate value fits in 64 bits
+MAX_UNIQUE_DOMAIN = 2**62
+
+
+def splitmix64(x):
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+class FeistelPermutation:
+    # Keyed permutation of [0, domain): a balanced Feistel network over
+    # [0, half**2) with cycle walking back into the domain. Distinct inputs
+    # always give distinct outputs, with no table of values seen so far
+    def __init__(self, domain, key, rounds=8):
+        self.domain = domain
+        self.half = math.isqrt(domain - 1) + 1
+        digest = hmac.new(key, b"feistel", hashlib.sha512).digest()
+        self.round_keys = [np.uint64(int.from_bytes(digest[i * 8:i * 8 + 8], "big")) for i in range(rounds)]
+
+    def encrypt(self, x):
+        half = np.uint64(self.half)
+        left, right = np.divmod(x.astype(np.uint64), half)
+        for round_key in self.round_keys:
+            left, right = right, (left + splitmix64(right ^ round_key) % half) % half
+        return (left * half + right).astype(np.int64)
+
+    def permute(self, x):
+        # Values pushed outside the domain are encrypted again until they land in it;
+        # half**2 < 4 * domain, so few values need more than one extra round trip
+        y = self.encrypt(np.asarray(x, dtype=np.int64))
+        outside = np.flatnonzero(y >= self.domain)
+        while len(outside):
+            y[outside] = self.encrypt(y[outside])
+            outside = outside[y[outside] >= self.domain]
+        return y
+
+
+# Text of an integer key; a zero fraction ("1000.0") is allowed
+INTEGER_TEXT = re.compile(r"[+-]?[0-9]+(?:\.0*)?")
+
+
+def integer_key(value):
+    # The exact integer a key holds, never through float, or None
+    if isinstance(value, str):
+        text = value.strip()
+        return int(text.partition(".")[0]) if INTEGER_TEXT.fullmatch(text) else None
+    if isinstance(value, (int, np.integer)) and not isinstance(value, bool):
+        return int(value)
+    return None
+
+
+def digit_keys(values):
+    # Positions and integers of the values that are 1 to 18 ASCII digits, which always
+    # fit in int64, parsed a whole column at a time from their character codes
+    strings = values.astype(str)
+    lengths = np.char.str_len(strings) if len(strings) else np.zeros(0, dtype=np.int64)
+    candidates = np.flatnonzero((lengths >= 1) & (lengths <= 18))
+    lengths = lengths[candidates]
+    width = int(lengths.max()) if len(candidates) else 1
+    digits = strings[candidates].astype(f"U{width}").view(np.uint32).reshape(-1, width).astype(np.int64) - ord("0")
+    numbers = np.zeros(len(candidates), dtype=np.int64)
+    valid = np.ones(len(candidates), dtype=bool)
+    for position in range(width):
+        active = position < lengths
+        digit = digits[:, position]
+        valid &= ~active | ((digit >= 0) & (digit <= 9))
+        numbers = np.where(active, numbers * 10 + digit, numbers)
+    return candidates[valid], numbers[valid]
+
+
+def unique_columns(columns_to_mask):
+    # Columns with extra_params {"unique": True}. Readers load them as str: inferred
+    # types would turn "0735" into 735, or "1000" into 1000.0 next to an empty cell,
+    # and such keys would no longer map to distinct masked values
+    return [column for column, (_, _, extra_params) in columns_to_mask.items() if (extra_params or {}).get("unique")]
+
+
+class UniqueColumnMasker(ColumnMasker):
+    # Key columns masked with a format-preserving permutation: every in-format value
+    # (length characters of the alphabet, or an integer in range) maps to a distinct
+    # masked value of the same format, the same one in every chunk, shard and run
+    # with the same key. Nulls stay null
+    unique = True
+
+    def __init__(self, column, data_type, length, extra_params, key, alphabet=None, mask_function=None):
+        super().__init__(column, data_type, length, extra_params)
+        domain_name = str(extra_params.get("token_domain", column)).upper()
+        column_key = hmac.new(key.encode(), domain_name.encode(), hashlib.sha256).digest()
+        self.hash_key = column_key
+        self.keep_out_of_format = mask_function is mask_acct
+        if alphabet is not None:
+            self.function_name = f"{mask_function.__name__} (unique)"
+            self.alphabet = alphabet
+            self.base = len(alphabet)
+            self.codes = np.full(256, -1, dtype=np.int64)
+            self.codes[np.frombuffer(alphabet.encode("ascii"), dtype=np.uint8)] = np.arange(self.base)
+            domain = self.base**length
+        else:
+            self.function_name = "random_integer (unique)"
+            if length is not None:
+                self.min_value = 10 ** (length - 1)
+                self.max_value = 10**length - 1
+            else:
+                self.min_value = extra_params.get("min_value", 0)
+                self.max_value = extra_params.get("max_value", 2**31 - 1)
+            domain = self.max_value - self.min_value + 1
+        if domain > MAX_UNIQUE_DOMAIN:
+            raise ValueError(f"column {column}: unique masking supports at most {MAX_UNIQUE_DOMAIN} distinct values")
+        self.permutation = FeistelPermutation(domain, column_key)
+
+    def hashed(self, value):
+        # Out-of-format values are hashed into the domain first; only these can collide
+        digest = hmac.new(self.hash_key, str(value).encode(), hashlib.sha256).digest()
+        return int.from_bytes(digest[:8], "big") % self.permutation.domain
+
+    def check_keys(self, values):
+        # Floats have already lost leading zeros, and any digits past 2**53
+        if pd.api.types.infer_dtype(values) in ["string", "integer", "empty"]:
+            return
+        for value in values:
+            if isinstance(value, (float, np.floating)):
+                raise ValueError(
+                    f"column {self.column}: unique masking needs the keys as text or integers, got {value!r}; "
+                    f"read the column as str"
+                )
+
+    def mask(self, values, rng):
+        values = np.asarray(values, dtype=object)
+        masked = values.copy()
+        present = np.flatnonzero(~pd.isna(values))
+        self.check_keys(values[present])
+        if self.data_type == "INTEGER":
+            offsets = np.zeros(len(present), dtype=np.int64)
+            in_format = np.zeros(len(present), dtype=bool)
+            int64_range = -(2**63) <= self.min_value and self.max_value < 2**63
+            if int64_range:
+                positions, numbers = digit_keys(values[present])
+                in_range = (numbers >= self.min_value) & (numbers <= self.max_value)
+                in_format[positions[in_range]] = True
+                offsets[positions[in_range]] = numbers[in_range] - self.min_value
+            # Signs, spaces, fractions, longer keys and out-of-format values one at a time
+            for i in np.flatnonzero(~in_format):
+                number = integer_key(values[present[i]])
+                if number is not None and self.min_value <= number <= self.max_value:
+                    offsets[i] = number - self.min_value
+                else:
+                    offsets[i] = self.hashed(values[present[i]])
+            permuted = self.permutation.permute(offsets)
+            if int64_range:
+                masked[present] = (permuted + self.min_value).tolist()
+            else:
+                masked[present] = [int(offset) + self.min_value for offset in permuted]
+            return masked
+
+        strings = values[present].astype(str)
+        in_format = np.char.str_len(strings) == self.length if len(strings) else np.zeros(0, dtype=bool)
+        chars = strings[in_format].astype(f"U{self.length}").view(np.uint32).reshape(-1, self.length)
+        codes = self.codes[np.minimum(chars, 255)]
+        valid = np.all((codes >= 0) & (chars < 256), axis=1)
+        in_format[np.flatnonzero(in_format)[~valid]] = False
+        numbers = np.zeros(len(present), dtype=np.int64)
+        encoded = np.zeros(int(valid.sum()), dtype=np.int64)
+        for position in range(self.length):
+            encoded = encoded * self.base + codes[valid, position]
+        numbers[in_format] = encoded
+        if self.keep_out_of_format:
+            # mask_acct leaves values that are not an account number as they are
+            present = present[in_format]
+            numbers = numbers[in_format]
+        else:
+            numbers[~in_format] = [self.hashed(value) for value in values[present[~in_format]]]
+
+        permuted = self.permutation.permute(numbers)
+        digits = np.empty((len(permuted), self.length), dtype=np.uint8)
+        alphabet = np.frombuffer(self.alphabet.encode("ascii"), dtype=np.uint8)
+        for position in range(self.length - 1, -1, -1):
+            permuted, digit = np.divmod(permuted, self.base)
+            digits[:, position] = alphabet[digit]
+        masked[present] = digits.view(f"S{self.length}").ravel().astype(str).astype(object)
+        return masked
+
+    def mask_value(self, value):
+        return self.mask(np.array([value], dtype=object), None)[0]
+
+
+def compile_plan(columns_to_mask, mask_functions, upper_names=True, unique_key=None):
+    # upper_names matches the file masker, which looks mask functions up by the
+    # upper-cased column name; headerless files key them by column position instead.
+    # Columns with extra_params {"unique": True} are permuted under unique_key
+    plan = []
+    for column, (data_type, length, extra_params) in columns_to_mask.items():
+        extra_params = extra_params or {}
+        data_type = data_type.upper()
+        if extra_params.get("unique"):
+            column_masker = compile_unique(column, data_type, length, extra_params, mask_functions, upper_names, unique_key)
+        elif data_type in ["CHAR", "VARCHAR"]:
+            key = column.upper() if upper_names else column
+            column_masker = StringColumnMasker(
+                column, data_type, length, extra_params, mask_functions.get(key, mask_default)
+            )
+        elif data_type == "DECIMAL":
+            column_masker = DecimalColumnMasker(column, data_type, length, extra_params)
+        elif data_type == "DATE":
+            column_masker = DateColumnMasker(column, data_type, length, extra_params)
+        elif data_type == "TIMESTAMP":
+            column_masker = TimestampColumnMasker(column, data_type, length, extra_params)
+        elif data_type == "INTEGER":
+            column_masker = IntegerColumnMasker(column, data_type, length, extra_params)
+        else:
+            column_masker = ColumnMasker(column, data_type, length, extra_params)
+        plan.append(column_masker)
+    return plan
+
+
+def compile_unique(column, data_type, length, extra_params, mask_functions, upper_names, unique_key):
+    if unique_key is None:
+        raise ValueError(f"column {column}: unique masking needs a key")
+    if data_type == "INTEGER":
+        return UniqueColumnMasker(column, data_type, length, extra_params, unique_key)
+    if data_type in ["CHAR", "VARCHAR"]:
+        key = column.upper() if upper_names else column
+        mask_function = mask_functions.get(key, mask_default)
+        if mask_function in unique_alphabets and length:
+            return UniqueColumnMasker(
+                column, data_type, length, extra_params, unique_key, unique_alphabets[mask_function], mask_function
+            )
+    raise ValueError(
+        f"column {column}: unique masking supports INTEGER columns and "
+        f"{', '.join(function.__name__ for function in unique_alphabets)} columns with a length"
+    )
+
+
+# Masking functions that draw length random characters and need a length in the config
+length_functions = {mask_acct, mask_dea_name, mask_default, mask_integer}
+
+data_types = ["CHAR", "VARCHAR", "DECIMAL", "DATE", "TIMESTAMP", "INTEGER"]
+
+
+def range_problems(column, bounds, extra_params, start, end):
+    (start_name, start_default), (end_name, end_default) = start, end
+    try:
+        if bounds(extra_params.get(start_name, start_default), extra_params.get(end_name, end_default))[1] < 0:
+            return [f"column {column}: {start_name} is after {end_name}"]
+    except (TypeError, ValueError) as e:
+        return [f"column {column}: {e}"]
+    return []
+
+
+def plan_problems(columns_to_mask, mask_functions, upper_names=True):
+    # Configuration mistakes found without reading any data, one message per problem
+    problems = []
+    for column, spec in columns_to_mask.items():
+        if not isinstance(spec, tuple) or len(spec) != 3:
+            problems.append(f"column {column}: expected (data_type, length, extra_params), got {spec!r}")
+            continue
+        data_type, length, extra_params = spec
+        extra_params = extra_params or {}
+        data_type = str(data_type).upper()
+        if data_type not in data_types:
+            problems.append(f"column {column}: unknown data type {spec[0]!r}, the column is left unmasked")
+        elif data_type in ["CHAR", "VARCHAR"]:
+            mask_function = mask_functions.get(column.upper() if upper_names else column, mask_default)
+            if mask_function in length_functions and not (isinstance(length, int) and length > 0):
+                problems.append(f"column {column}: {mask_function.__name__} needs a positive length, got {length!r}")
+            if mask_function is mask_only_allowed_values and not extra_params.get("allowed_values"):
+                problems.append(f"column {column}: mask_only_allowed_values needs extra_params allowed_values")
+        elif data_type == "DECIMAL":
+            if not (
+                isinstance(length, tuple) and len(length) == 2 and all(isinstance(part, int) for part in length)
+                and 1 <= length[1] <= length[0]
+            ):
+                problems.append(
+                    f"column {column}: DECIMAL needs (precision, scale) with 1 <= scale <= precision, got {length!r}"
+                )
+        elif data_type == "INTEGER":
+            if length is not None and not (isinstance(length, int) and length > 0):
+                problems.append(f"column {column}: INTEGER length must be a positive number of digits, got {length!r}")
+            elif length is None and extra_params.get("min_value", 0) > extra_params.get("max_value", 2**31 - 1):
+                problems.append(f"column {column}: min_value is above max_value")
+        elif data_type == "DATE":
+            problems.extend(
+                range_problems(column, date_bounds, extra_params, ("start_date", "1900-01-01"), ("end_date", "2099-12-31"))
+            )
+        elif data_type == "TIMESTAMP":
+            problems.extend(
+                range_problems(
+                    column, timestamp_bounds, extra_params,
+                    ("start_timestamp", "1900-01-01 00:00:00"), ("end_timestamp", "2099-12-31 23:59:59"),
+                )
+            )
+    if problems:
+        return problems
+    try:
+        compile_plan(columns_to_mask, mask_functions, upper_names, unique_key="check")
+    except Exception as e:
+        problems.append(f"{type(e).__name__}: {e}")
+    return problems
@@ -0,0 +1,56 @@
+import json
+import time
+
+
+class MaskingProfile:
+    # Wall time, rows processed and masked values generated per (column, masking function)
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.entries = {}
+
+    def record(self, column, function, rows=0, values=0, seconds=0.0):
+        entry = self.entries.setdefault((column, function), {"rows": 0, "values": 0, "seconds": 0.0})
+        entry["rows"] += rows
+        entry["values"] += values
+        entry["seconds"] += seconds
+
+    def merge(self, entries):
+        # entries as returned by to_list(), e.g. from a worker process
+        for entry in entries:
+            self.record(entry["column"], entry["function"], entry["rows"], entry["values"], entry["seconds"])
+
+    def to_list(self):
+        return [{"column": column, "function": function, **entry} for (column, function), entry in self.entries.items()]
+
+    def per_function(self):
+        totals = {}
+        for (_, function), entry in self.entries.items():
+            total = totals.setdefault(function, {"rows": 0, "values": 0, "seconds": 0.0})
+            for field in total:
+                total[field] += entry[field]
+        return totals
+
+    def summary(self):
+        lines = [f"{'column':<20}{'function':<28}{'rows':>12}{'values':>12}{'seconds':>10}{'us/row':>9}"]
+        for entry in sorted(self.to_list(), key=lambda entry: -entry["seconds"]):
+            us_per_row = entry["seconds"] / entry["rows"] * 1e6 if entry["rows"] else 0.0
+            lines.append(
+                f"{str(entry['column']):<20}{entry['function']:<28}{entry['rows']:>12}{entry['values']:>12}"
+                f"{entry['seconds']:>10.3f}{us_per_row:>9.2f}"
+            )
+        lines.append(f"Masked in {time.perf_counter() - self.started:.2f}s")
+        return "\n".join(lines)
+
+    def write(self, output_file):
+        # The report sits next to the masked file as <output_file>.profile.json
+        report_file = f"{output_file}.profile.json"
+        report = {
+            "output_file": output_file,
+            "wall_seconds": time.perf_counter() - self.started,
+            "columns": self.to_list(),
+            "functions": self.per_function(),
+        }
+        with open(report_file, "w") as f:
+            json.dump(report, f, indent=2)
+        print(self.summary())
+        return report_file
@@ -0,0 +1,82 @@
+import random
+import sys
+import numpy as np
+
+
+class NamePool:
+    # Deduplicated names, drawn by index. Duplicates in the source list would make
+    # those names more likely, so each name is kept once (first occurrence order)
+    # and interned. The upper-cased variant is built on first use
+    def __init__(self, names):
+        self.names = [sys.intern(name) for name in dict.fromkeys(names)]
+        self.arrays = {}
+        self.upper_names = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def variant(self, upper=False):
+        if not upper:
+            return self.names
+        if self.upper_names is None:
+            self.upper_names = [sys.intern(name.upper()) for name in self.names]
+        return self.upper_names
+
+    def choice(self, upper=False):
+        # Per-cell draw from the random module
+        return random.choice(self.variant(True) if upper else self.names)
+
+    def draw(self, rng, n, upper=False):
+        # n names in one draw from a numpy Generator, picked from a cached object array
+        if upper not in self.arrays:
+            self.arrays[upper] = np.array(self.variant(upper), dtype=object)
+        return self.arrays[upper][rng.integers(0, len(self.names), size=n)]
+
+
+def entry_table(text):
+    # Newline-separated entries as one UTF-8 buffer (a newline after each entry)
+    # and the byte offsets where each entry starts and where the next one starts
+    buffer = np.frombuffer((text + "\n").encode("utf-8"), dtype=np.uint8)
+    ends = np.flatnonzero(buffer == ord("\n")) + 1
+    starts = np.concatenate([[0], ends[:-1]])
+    return buffer, starts, ends
+
+
+class DictionaryPool:
+    # Names from an external dictionary file (UTF-8, one entry per line), read on
+    # first use so a large dictionary costs nothing at startup. Entries are kept
+    # deduplicated in one UTF-8 buffer with their offsets, about the size of the
+    # file, rather than as a Python str each, and are drawn by index
+    def __init__(self, path):
+        self.path = path
+        self.tables = {}
+
+    def load(self, upper=False):
+        if False not in self.tables:
+            with open(self.path, encoding="utf-8") as f:
+                entries = dict.fromkeys(line.strip() for line in f)
+            entries.pop("", None)
+            if not entries:
+                raise ValueError(f"dictionary {self.path} has no entries")
+            self.tables[False] = entry_table("\n".join(entries))
+        if upper and True not in self.tables:
+            buffer, _, _ = self.tables[False]
+            self.tables[True] = entry_table(buffer[:-1].tobytes().decode("utf-8").upper())
+        return self.tables[upper]
+
+    def __len__(self):
+        return len(self.load()[1])
+
+    def choice(self, upper=False):
+        # Per-cell draw from the random module
+        buffer, starts, ends = self.load(upper)
+        i = random.randrange(len(starts))
+        return buffer[starts[i]:ends[i] - 1].tobytes().decode("utf-8")
+
+    def draw(self, rng, n, upper=False):
+        # The picked entries are gathered into one buffer and decoded in one go
+        buffer, starts, ends = self.load(upper)
+        picked = rng.integers(0, len(starts), size=n)
+        sizes = ends[picked] - starts[picked]
+        gathered = np.repeat(starts[picked] - (np.cumsum(sizes) - sizes), sizes) + np.arange(sizes.sum())
+        return np.array(buffer[gathered].tobytes().decode("utf-8").split("\n")[:-1], dtype=object)
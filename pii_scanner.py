@@ -0,0 +1,476 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from scan_index import ScanIndex, file_sha256
+
+# The five patterns of scannnnnn.py, in the order a span matching several is
+# reported under: each span is reported once, under the first category that matches
+# at its start. Whitespace inside a match never crosses a line break, so every
+# finding lies on one line as in the line-by-line scanners
+PII_PATTERNS = {
+    "in_phone": rb"\+91[ \t\r\f\v]?\d{10}|\+91[ \t\r\f\v]?\(?\d{3}\)?[ \t\r\f\v]?\d{3}[ \t\r\f\v]?\d{4}",
+    # Only the domain part: the local part is found by walking back from the "@"
+    "email": rb"@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b",
+    "ssn": rb"\b\d{3}-\d{2}-\d{4}\b",
+    "passport": rb"\b[A-Z]{1}[0-9]{7}\b",
+    "us_phone": (
+        rb"(?:\+\d{1,2}[ \t\r\f\v]?)?1?\-?\.?[ \t\r\f\v]?\(?\d{3}\)?[ \t\r\f\v.-]?\d{3}[ \t\r\f\v.-]?\d{4}"
+        rb"(?:[ \t\r\f\v]?ext\.?[ \t\r\f\v]?\d{1,5})?"
+    ),
+}
+
+CATEGORY_LABELS = {
+    "us_phone": "US phone numbers",
+    "in_phone": "India phone numbers",
+    "email": "Email addresses",
+    "ssn": "SSN numbers",
+    "passport": "Passport numbers",
+}
+
+# Every match starts with one of these bytes (an email at its "@"). Whitespace is
+# not one of them, so a phone number is reported without the blank before it
+START_BYTES = rb"+\-.(\dA-Z@"
+
+EMAIL_LOCAL_BYTES = frozenset(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789._%+-")
+
+WORD_BOUNDARY = re.compile(rb"\b")
+
+
+def combined_regex(patterns=PII_PATTERNS, start_bytes=START_BYTES):
+    # One alternation with a named group per category. The pattern opens with a
+    # character class so the regex engine skips every byte that cannot start a match
+    # in its C search loop; the zero-width lookahead behind it then matches the
+    # categories from that byte and leaves the whole span in the category's group
+    alternation = b"|".join(b"(?P<%s>%s)" % (name.encode(), pattern) for name, pattern in patterns.items())
+    return re.compile(b"[" + start_bytes + b"](?<=(?=" + alternation + b").)")
+
+
+def scanner_version(patterns=PII_PATTERNS):
+    # Hash of the combined regex; findings stored in a ScanIndex are only reused with the same one
+    return hashlib.sha256(combined_regex(patterns).pattern).hexdigest()
+
+
+class PiiScanner:
+    def __init__(self, patterns=PII_PATTERNS):
+        self.regex = combined_regex(patterns)
+
+    def email_start(self, data, at, floor):
+        # Start of the local part before the "@" at at: the longest run of local part
+        # bytes that starts on a word boundary, as \b[A-Za-z0-9._%+-]+ would match it
+        start = at
+        while start > floor and data[start - 1] in EMAIL_LOCAL_BYTES:
+            start -= 1
+        while start < at and not WORD_BOUNDARY.match(data, start):
+            start += 1
+        return start if start < at else None
+
+    def scan_spans(self, data, start=0, stop=None, floor=0):
+        # (category, start, end) of the matches found from the positions [start, stop)
+        # of data in one sweep, none starting before floor; the bytes around the range
+        # are context for word boundaries, email local parts and matches running past stop
+        stop = len(data) if stop is None else stop
+        spans = []
+        end = floor
+        for match in self.regex.finditer(data, start):
+            if match.start() >= stop:
+                break
+            if match.start() < end:
+                continue
+            category = match.lastgroup
+            span_start = match.start()
+            if category == "email":
+                span_start = self.email_start(data, match.start(), floor)
+                if span_start is not None:
+                    # Findings inside the local part belong to the email; one that
+                    # starts before it and runs into it keeps its bytes
+                    while spans and spans[-1][1] >= span_start:
+                        spans.pop()
+                    if spans and spans[-1][2] > span_start:
+                        span_start = self.email_start(data, match.start(), spans[-1][2])
+                if span_start is None:
+                    continue
+            end = match.end(category)
+            spans.append((category, span_start, end))
+        return spans
+
+    def findings(self, data, spans, offset=0, line=1, line_position=0):
+        # Spans as dicts of category, value, byte offset and line number, where offset
+        # is the file offset of data[0] and line the line number at data[line_position]
+        findings = []
+        for category, start, end in spans:
+            line += data.count(b"\n", line_position, start)
+            line_position = max(line_position, start)
+            findings.append(
+                {
+                    "category": category,
+                    "value": data[start:end].decode("ascii", "replace"),
+                    "offset": offset + start,
+                    "line": line,
+                }
+            )
+        return findings
+
+    def scan(self, data, offset=0, line=1):
+        # Findings in data (bytes); offset and line are those of data[0] in its file
+        return self.findings(data, self.scan_spans(data), offset, line)
+
+    def scan_stream(self, f, block_size=8 * 1024 * 1024, overlap=4096):
+        # Findings of a binary file object, read block_size bytes at a time. A block is
+        # scanned up to its last line break, which no match crosses, and the rest of it
+        # is carried into the next block. A line longer than a block is cut overlap bytes
+        # before the end of the block instead: the whole block is scanned, so an email
+        # whose "@" lies past the cut still claims the passport or phone number in its
+        # local part, but only the findings starting before the cut are reported and the
+        # rest are scanned again with the next block. Matches shorter than overlap come
+        # out as in a scan of the whole file. overlap bytes before each block are kept as
+        # context for word boundaries and email local parts
+        data = b""
+        offset = 0
+        line = 1
+        start = 0
+        floor = 0
+        while True:
+            block = f.read(block_size)
+            data = data + block
+            if not block:
+                stop = scan_stop = len(data)
+            else:
+                newline = data.rfind(b"\n", start)
+                if newline != -1:
+                    stop = scan_stop = newline + 1
+                else:
+                    stop = max(start, len(data) - overlap)
+                    scan_stop = len(data)
+            if stop > start:
+                spans = [span for span in self.scan_spans(data, start, scan_stop, floor) if span[1] < stop]
+                yield from self.findings(data, spans, offset, line, start)
+                if spans:
+                    floor = spans[-1][2]
+                line += data.count(b"\n", start, stop)
+            if not block:
+                return
+            # data[0] moves to overlap bytes before stop; offset, floor and start follow it
+            context = min(overlap, stop)
+            data = data[stop - context:]
+            offset += stop - context
+            floor = max(0, floor - (stop - context))
+            start = context
+
+    def scan_file(self, file_path, block_size=8 * 1024 * 1024, overlap=4096):
+        with open(file_path, "rb") as f:
+            return list(self.scan_stream(f, block_size, overlap))
+
+
+def count_categories(findings):
+    counts = dict.fromkeys(CATEGORY_LABELS, 0)
+    for finding in findings:
+        counts[finding["category"]] += 1
+    return counts
+
+
+# Columns of the findings report; values are only written when asked for, so the
+# report does not become one more copy of the PII it points at
+FINDING_FIELDS = ["file", "offset", "line", "category"]
+
+
+class FindingsWriter:
+    # Writes findings as they are found, as JSON lines or as CSV rows
+    def __init__(self, path, output_format=None, with_values=False):
+        self.output_format = output_format or ("csv" if path.endswith(".csv") else "jsonl")
+        self.fields = FINDING_FIELDS + ["value"] if with_values else FINDING_FIELDS
+        self.file = sys.stdout if path == "-" else open(path, "w", newline="")
+        if self.output_format == "csv":
+            self.writer = csv.DictWriter(self.file, fieldnames=self.fields, extrasaction="ignore")
+            self.writer.writeheader()
+
+    def write(self, file_path, finding):
+        row = {"file": file_path, **finding}
+        if self.output_format == "csv":
+            self.writer.writerow(row)
+        else:
+            self.file.write(json.dumps({field: row[field] for field in self.fields}) + "\n")
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+# Bytes of text files: printable ASCII, common whitespace and anything non-ASCII (UTF-8)
+TEXT_BYTES = bytes(range(32, 127)) + b"\t\n\r\f\b" + bytes(range(128, 256))
+
+
+def text_file(path, sniff_size=8192):
+    # Binary files are skipped: a NUL byte, or more than 30% control bytes, in the first sniff_size bytes
+    with open(path, "rb") as f:
+        head = f.read(sniff_size)
+    if b"\0" in head:
+        return False
+    return len(head.translate(None, TEXT_BYTES)) <= len(head) * 0.3
+
+
+def walk_files(paths):
+    # Files named on the command line and the files under the directories, without following symlinks
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for directory, subdirectories, files in os.walk(path):
+            subdirectories.sort()
+            for name in sorted(files):
+                file_path = os.path.join(directory, name)
+                if not os.path.islink(file_path):
+                    yield file_path
+
+
+def shard_ranges(path, size, shard_size):
+    # Byte ranges of about shard_size bytes, each ending after a line break
+    ranges = []
+    start = 0
+    with open(path, "rb") as f:
+        while start < size:
+            end = start + shard_size
+            if end >= size:
+                end = size
+            else:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+class RangeReader:
+    # Reads at most length bytes from the current position of f, counts their line breaks and hashes them
+    def __init__(self, f, length):
+        self.f = f
+        self.remaining = length
+        self.newlines = 0
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size):
+        data = self.f.read(min(size, self.remaining))
+        self.remaining -= len(data)
+        self.newlines += data.count(b"\n")
+        self.sha256.update(data)
+        return data
+
+
+# PiiScanner of a worker process, compiled once for every file it scans
+worker_scanner = None
+
+
+def scan_shard(path, start, end, block_size, overlap, sniff):
+    # Findings of the bytes [start, end) of path, with line numbers counted from
+    # the start of the range, the line breaks in the range and its sha256
+    global worker_scanner
+    if worker_scanner is None:
+        worker_scanner = PiiScanner()
+    try:
+        if sniff and not text_file(path):
+            return path, start, "binary", [], 0, None
+        with open(path, "rb") as f:
+            f.seek(start)
+            reader = RangeReader(f, end - start)
+            findings = list(worker_scanner.scan_stream(reader, block_size, overlap))
+    except OSError as e:
+        return path, start, f"error: {e}", [], 0, None
+    for finding in findings:
+        finding["offset"] += start
+    return path, start, "ok", findings, reader.newlines, reader.sha256.hexdigest()
+
+
+def scan_shards(shards, block_size, overlap):
+    # Process pool entry point: scans a batch of (path, start, end, sniff) shards
+    return [scan_shard(path, start, end, block_size, overlap, sniff) for path, start, end, sniff in shards]
+
+
+def scan_paths(
+    paths, writer, workers=None, shard_size=64 * 1024 * 1024, block_size=8 * 1024 * 1024, overlap=4096,
+    batch_files=256, index=None, with_values=False,
+):
+    # Scans every file under paths in a process pool and writes the findings of each
+    # file to writer as soon as all of its shards are done. Files larger than shard_size
+    # are split at line breaks and their shards scanned in parallel; small files go to
+    # the pool in batches of up to batch_files files or shard_size bytes. With an index,
+    # files unchanged since the last scan are not scanned again and their findings
+    # come from the index
+    started = time.perf_counter()
+    # A file modified in the same clock tick as its scan could change again without
+    # changing its mtime; such files are stored with no mtime and verified by hash
+    trusted_mtime_ns = time.time_ns() - 2 * 10**9
+    summary = {
+        "files": 0, "binary": 0, "errors": 0, "bytes": 0, "cached": 0, "forgotten": 0,
+        "counts": dict.fromkeys(CATEGORY_LABELS, 0),
+    }
+    shards = {}
+    pending = {}
+    stats = {}
+    # Paths found by this scan; index entries of other paths under paths are removed
+    seen = set()
+
+    def report(path, findings):
+        for finding in findings:
+            writer.write(path, finding)
+            summary["counts"][finding["category"]] += 1
+
+    def collect(path, start, status, findings, newlines, sha256):
+        # Keeps a shard's result until all shards of its file are in, then reports the file
+        pending[path].append((start, status, findings, newlines, sha256))
+        if len(pending[path]) < shards[path]:
+            return
+        file_shards = sorted(pending.pop(path), key=lambda result: result[0])
+        statuses = [status for _, status, _, _, _ in file_shards if status != "ok"]
+        size, mtime_ns = stats.pop(path)
+        if statuses and statuses[0] != "binary":
+            summary["errors"] += 1
+            print(f"{path}: {statuses[0]}", file=sys.stderr)
+            return
+        file_findings = []
+        lines_before = 0
+        for _, _, findings, newlines, _ in file_shards:
+            for finding in findings:
+                finding["line"] += lines_before
+                file_findings.append(finding)
+            lines_before += newlines
+        if statuses:
+            summary["binary"] += 1
+        else:
+            report(path, file_findings)
+            summary["files"] += 1
+            summary["bytes"] += size
+        if index is not None:
+            # Files that changed while they were scanned are left for the next run
+            try:
+                stat = os.stat(path)
+                if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                    return
+                if statuses:
+                    sha256 = None
+                elif len(file_shards) > 1:
+                    sha256 = file_sha256(path)
+                else:
+                    sha256 = file_shards[0][4]
+            except OSError:
+                return
+            index.store(
+                os.path.abspath(path), size, mtime_ns if mtime_ns < trusted_mtime_ns else -1, sha256,
+                "binary" if statuses else "ok", file_findings, with_values,
+            )
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Up to two batches per worker are in flight; a result is dropped as soon as it
+        # is collected, so memory follows the batches in flight and the files waiting
+        # for their other shards, not the findings of the whole tree
+        in_flight = set()
+        max_in_flight = 2 * (workers or os.cpu_count())
+
+        def collect_done():
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                in_flight.remove(future)
+                for result in future.result():
+                    collect(*result)
+
+        def submit(shard_batch):
+            while len(in_flight) >= max_in_flight:
+                collect_done()
+            in_flight.add(pool.submit(scan_shards, shard_batch, block_size, overlap))
+
+        batch = []
+        batch_bytes = 0
+        for path in walk_files(paths):
+            try:
+                stat = os.stat(path)
+                size = stat.st_size
+                seen.add(os.path.abspath(path))
+                if index is not None:
+                    cached = index.lookup(
+                        os.path.abspath(path), size, stat.st_mtime_ns, with_values, stat.st_mtime_ns >= trusted_mtime_ns
+                    )
+                    if cached is not None:
+                        status, findings = cached
+                        summary["cached"] += 1
+                        if status == "binary":
+                            summary["binary"] += 1
+                        else:
+                            report(path, findings)
+                        continue
+                if size > shard_size and not text_file(path):
+                    summary["binary"] += 1
+                    if index is not None:
+                        index.store(os.path.abspath(path), size, stat.st_mtime_ns, None, "binary", [])
+                    continue
+            except OSError as e:
+                print(f"{path}: {e}", file=sys.stderr)
+                summary["errors"] += 1
+                continue
+            stats[path] = (size, stat.st_mtime_ns)
+            pending[path] = []
+            if size > shard_size:
+                ranges = shard_ranges(path, size, shard_size)
+                shards[path] = len(ranges)
+                for start, end in ranges:
+                    submit([(path, start, end, False)])
+                continue
+            shards[path] = 1
+            batch.append((path, 0, size, True))
+            batch_bytes += size
+            if len(batch) >= batch_files or batch_bytes >= shard_size:
+                submit(batch)
+                batch = []
+                batch_bytes = 0
+        if batch:
+            submit(batch)
+        while in_flight:
+            collect_done()
+    if index is not None:
+        summary["forgotten"] = index.forget_missing(paths, seen)
+    summary["seconds"] = time.perf_counter() - started
+    return summary
+
+
+def scan_summary(summary):
+    mb = summary["bytes"] / 1e6
+    lines = [
+        f"Scanned {summary['files']} files, {mb:.1f} MB in {summary['seconds']:.1f}s "
+        f"({mb / summary['seconds'] if summary['seconds'] else 0:.1f} MB/s); "
+        f"skipped {summary['binary']} binary files, {summary['errors']} errors"
+    ]
+    if summary["cached"]:
+        lines.append(f"{summary['cached']} unchanged files were not scanned again, their findings come from the index")
+    if summary["forgotten"]:
+        lines.append(f"{summary['forgotten']} files no longer found were removed from the index")
+    lines.extend(f"{summary['counts'][category]:>10} {label}" for category, label in CATEGORY_LABELS.items())
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scan text files for phone numbers, emails, SSNs and passport numbers")
+    parser.add_argument("paths", nargs="+", help="files, and directories to scan recursively")
+    parser.add_argument("--output", default="pii_findings.jsonl", help="findings report, .jsonl or .csv; - for stdout")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="report format (default: from the --output extension)")
+    parser.add_argument("--values", action="store_true", help="also write the matched values to the report")
+    parser.add_argument("--workers", type=int, help="scanning processes (default: one per CPU)")
+    parser.add_argument("--shard-size", type=int, default=64, help="MB per shard of a large file scanned in parallel")
+    parser.add_argument("--block-size", type=int, default=8, help="MB read and scanned at a time")
+    parser.add_argument("--overlap", type=int, default=4096, help="bytes rescanned when a line is longer than a block")
+    parser.add_argument("--index", help="SQLite index of scanned files; unchanged files are not scanned again")
+    args = parser.parse_args()
+
+    writer = FindingsWriter(args.output, args.format, args.values)
+    index = ScanIndex(args.index, scanner_version()) if args.index else None
+    summary = scan_paths(
+        args.paths, writer, args.workers, args.shard_size * 1024 * 1024, args.block_size * 1024 * 1024, args.overlap,
+        index=index, with_values=args.values,
+    )
+    if index is not None:
+        index.close()
+    writer.close()
+    print(scan_summary(summary), file=sys.stderr if args.output == "-" else sys.stdout)
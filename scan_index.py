@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import sqlite3
+
+
+def file_sha256(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ScanIndex:
+    # SQLite-backed path -> (size, mtime, sha256, findings) store of the PII scanner.
+    # A file whose size and mtime are unchanged is not read again; one whose mtime
+    # changed but whose content hash did not (touched, copied back) is only hashed.
+    # scanner_version identifies the patterns the findings were made with; an index
+    # made with other patterns is emptied when it is opened
+    def __init__(self, path, scanner_version, batch_size=1000):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = []
+        self.connection = sqlite3.connect(path, timeout=600)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, sha256 TEXT, "
+            "status TEXT NOT NULL, with_values INTEGER NOT NULL, findings TEXT NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self.connection.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT)")
+        row = self.connection.execute("SELECT value FROM settings WHERE name = 'scanner_version'").fetchone()
+        if row is None or row[0] != scanner_version:
+            self.connection.execute("DELETE FROM files")
+            self.connection.execute("INSERT OR REPLACE INTO settings VALUES ('scanner_version', ?)", (scanner_version,))
+        self.connection.commit()
+
+    def lookup(self, path, size, mtime_ns, with_values=False, racy=False):
+        # Returns (status, findings) of the last scan of path if the file has not
+        # changed since, None otherwise. Findings stored without their values do
+        # not serve a scan that reports values. A racy mtime, too recent to rule out
+        # another write in the same clock tick, is not stored
+        row = self.connection.execute(
+            "SELECT mtime_ns, sha256, status, with_values, findings FROM files WHERE path = ? AND size = ?",
+            (path, size),
+        ).fetchone()
+        if row is None or (with_values and not row[3]):
+            return None
+        if row[0] != mtime_ns:
+            if row[1] is None or file_sha256(path) != row[1]:
+                return None
+            self.pending.append(("UPDATE files SET mtime_ns = ? WHERE path = ?", (-1 if racy else mtime_ns, path)))
+        return row[2], json.loads(row[4])
+
+    def store(self, path, size, mtime_ns, sha256, status, findings, with_values=False):
+        # Values are only kept when the report has them too, so the index is not
+        # one more copy of the PII it points at
+        if not with_values:
+            findings = [{key: value for key, value in finding.items() if key != "value"} for finding in findings]
+        self.pending.append(
+            (
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, size, mtime_ns, sha256, status, int(with_values), json.dumps(findings)),
+            )
+        )
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def forget_missing(self, roots, seen):
+        # Removes the entries under roots (files or directories) whose paths were not
+        # seen by the scan; returns how many were removed
+        self.flush()
+        missing = set()
+        for root in roots:
+            root = os.path.abspath(root)
+            prefix = root.rstrip(os.sep) + os.sep
+            rows = self.connection.execute(
+                "SELECT path FROM files WHERE path = ? OR (path >= ? AND path < ?)",
+                (root, prefix, prefix[:-1] + chr(ord(os.sep) + 1)),
+            )
+            missing.update(path for path, in rows if path not in seen)
+        with self.connection:
+            self.connection.executemany("DELETE FROM files WHERE path = ?", ((path,) for path in missing))
+        return len(missing)
+
+    def flush(self):
+        with self.connection:
+            for statement, parameters in self.pending:
+                self.connection.execute(statement, parameters)
+        self.pending = []
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def close(self):
+        self.flush()
+        self.connection.close()
@@ -0,0 +1,41 @@
+import hashlib
+import hmac
+from collections import OrderedDict
+
+
+class TokenCache:
+    # Bounded LRU map of (domain, input value) -> masked value
+    def __init__(self, max_size=1000000):
+        self.max_size = max_size
+        self.tokens = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self.tokens
+
+    def get(self, key):
+        self.tokens.move_to_end(key)
+        self.hits += 1
+        return self.tokens[key]
+
+    def put(self, key, token):
+        self.misses += 1
+        self.tokens[key] = token
+        if len(self.tokens) > self.max_size:
+            self.tokens.popitem(last=False)
+
+
+def token_value(value):
+    # 6984, 6984.0 and "6984" are the same key whichever way the file was parsed
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def token_seed(key, domain, value):
+    # Keyed hash of the input value: the same key, domain and value seed the
+    # same draw in every file and every run, without storing any mapping
+    message = f"{domain}\x1f{token_value(value)}".encode()
+    digest = hmac.new(key.encode(), message, hashlib.sha256).digest()
+    return int.from_bytes(digest[:16], "big")
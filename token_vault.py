@@ -0,0 +1,51 @@
+import sqlite3
+
+
+class TokenVault:
+    # SQLite-backed (domain, value) -> token store shared by every run and worker.
+    # Lookups and writes go through in batches so millions of keys per run stay cheap.
+    def __init__(self, path, batch_size=900):
+        self.path = path
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(path, timeout=600)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS tokens ("
+            "domain TEXT NOT NULL, value TEXT NOT NULL, token, PRIMARY KEY (domain, value)"
+            ") WITHOUT ROWID"
+        )
+        self.connection.commit()
+
+    def lookup(self, domain, values):
+        # Returns {value: token} for the values already in the vault; batches stay
+        # under the 999 bound parameters older SQLite builds allow per statement
+        found = {}
+        for i in range(0, len(values), self.batch_size):
+            batch = values[i:i + self.batch_size]
+            found.update(
+                self.connection.execute(
+                    f"SELECT value, token FROM tokens WHERE domain = ? AND value IN ({','.join('?' * len(batch))})",
+                    [domain, *batch],
+                )
+            )
+        return found
+
+    def store(self, domain, tokens):
+        # A key another run or worker stored first keeps its token, so the
+        # stored winners are read back whenever any insert was ignored
+        changes = self.connection.total_changes
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO tokens VALUES (?, ?, ?)",
+                ((domain, value, token) for value, token in tokens.items()),
+            )
+        if self.connection.total_changes - changes == len(tokens):
+            return tokens
+        return self.lookup(domain, list(tokens))
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM tokens").fetchone()[0]
+
+    def close(self):
+        self.connection.close()